@@ -11,11 +11,518 @@ import time
 import os      # --- NEW: For creating folders/paths ---
 import csv     # --- NEW: For saving CSV log ---
 import tempfile # --- NEW: For gTTS ---
+import tracemalloc
+import sys
+import argparse
+import glob
+import hashlib
+import hmac
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import json
+import itertools
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 import requests
 from gtts import gTTS # --- NEW: For gTTS ---
 from playsound import playsound # --- NEW: For gTTS ---
 
 
+class _NullSpan:
+    """Shared no-op span handed out while tracing is off."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer, self.name, self.cat, self.args = tracer, name, cat, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.start, time.perf_counter(), cat=self.cat, **self.args)
+        return False
+
+
+class TraceRecorder:
+    """Lightweight cross-thread tracer exported as Chrome/Perfetto trace JSON.
+
+    Events go into a bounded deque (oldest dropped first) and can be
+    recorded from any thread. All timestamps are time.perf_counter()
+    values, the same clock CaptureSource stamps frames with, so a frame's
+    capture time can be carried through the audio and haptic queues and
+    closed on the worker thread that delivers the cue.
+
+    When `enabled` is False every call returns after a single attribute
+    check, so the hooks can stay in the hot path.
+    """
+    def __init__(self, capacity=200000, enabled=False):
+        self.enabled = enabled
+        self.events = collections.deque(maxlen=capacity)
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+        self._thread_names = {}
+        self._ids = itertools.count(1)
+
+    def _tid(self):
+        tid = threading.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        return tid
+
+    def _us(self, ts):
+        return round((ts - self._t0) * 1e6, 1)
+
+    def next_id(self):
+        return next(self._ids)
+
+    def span(self, name, cat="frame", **args):
+        """Context manager recording a complete ('X') event on this thread."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def complete(self, name, start, end, cat="frame", **args):
+        if not self.enabled:
+            return
+        self.events.append({"name": name, "cat": cat, "ph": "X", "ts": self._us(start),
+                            "dur": self._us(end) - self._us(start), "pid": self._pid,
+                            "tid": self._tid(), "args": args})
+
+    def async_span(self, name, start, end, span_id, cat="latency", **args):
+        """Records an interval that may start on one thread and end on another."""
+        if not self.enabled:
+            return
+        tid = self._tid()
+        self.events.append({"name": name, "cat": cat, "ph": "b", "id": span_id,
+                            "ts": self._us(start), "pid": self._pid, "tid": tid, "args": args})
+        self.events.append({"name": name, "cat": cat, "ph": "e", "id": span_id,
+                            "ts": self._us(end), "pid": self._pid, "tid": tid})
+
+    def flow(self, name, flow_id, ts, start):
+        """Flow arrow between threads: start=True where a cue is queued, False where it is consumed."""
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": "flow", "ph": "s" if start else "f", "id": flow_id,
+                 "ts": self._us(ts), "pid": self._pid, "tid": self._tid()}
+        if not start:
+            event["bp"] = "e"
+        self.events.append(event)
+
+    def export(self, path):
+        """Writes the buffered events as trace-event JSON (chrome://tracing, ui.perfetto.dev)."""
+        events = list(self.events)
+        for tid, name in list(self._thread_names.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                           "args": {"name": name}})
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Trace with {len(events)} events written to {path}")
+        return path
+
+
+def _json_default(obj):
+    """json.dumps fallback for NumPy scalars in analyze_form data."""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+_DASHBOARD_PAGE = b"""<!DOCTYPE html>
+<html><head><title>SmartPhysio Dashboard</title>
+<style>body{background:#222;color:#eee;font-family:sans-serif;margin:16px}
+img{max-width:100%;border:1px solid #555}pre{font-size:15px}</style></head>
+<body><h2>SmartPhysio - live session</h2>
+<img id="video"><pre id="data">waiting for data...</pre>
+<script>
+// Pass the page's ?token=... on to the streams
+document.getElementById('video').src = '/stream.mjpg' + location.search;
+var es = new EventSource('/events' + location.search);
+es.onmessage = function(e) {
+  document.getElementById('data').textContent = JSON.stringify(JSON.parse(e.data), null, 2);
+};
+</script></body></html>
+"""
+
+
+class DashboardServer:
+    """Built-in HTTP server streaming the annotated session to browsers.
+
+    Routes:
+      /             viewer page
+      /stream.mjpg  annotated frames as MJPEG
+      /events       per-frame analyze_form data as server-sent events (JSON)
+      /data.json    latest data snapshot
+
+    `publish()` is called from the video loop and never blocks on clients:
+    the frame is copied into a pooled buffer and JPEG-encoded once by a
+    small worker pool, and every viewer is sent the newest encoded frame
+    when it is ready for one. Frames are dropped (not queued) when all
+    encoders are busy or when a client is slower than the camera, and
+    nothing is encoded while no one is watching.
+
+    The server binds to localhost by default. With `token`, every route
+    requires a matching `?token=` query parameter (403 otherwise).
+    """
+    BOUNDARY = "physioframe"
+
+    def __init__(self, host="127.0.0.1", port=8080, jpeg_quality=70, workers=2, max_width=960, token=None):
+        self.token = token or None
+        self.jpeg_quality = int(jpeg_quality)
+        self.workers = workers
+        self.max_width = max_width
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg-encoder")
+        self._free_bufs = []  # reusable copies of the annotated frame, one per in-flight encode
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._jpeg, self._jpeg_id, self._jpeg_seq = None, 0, 0
+        self._data_json, self._data_seq = b"{}", 0
+        self._running = True
+        self.viewers = 0
+
+        # Stats for the session summary
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Dashboard streaming on http://{host}:{port}/" + ("?token=..." if self.token else ""))
+        if host not in ("127.0.0.1", "localhost", "::1") and not self.token:
+            print("Warning: dashboard is reachable from the network without a token "
+                  "(set PHYSIO_DASHBOARD_TOKEN)")
+
+    def publish(self, frame, data, frame_id):
+        """Hands the annotated frame and its data to the streaming clients. Non-blocking."""
+        try:
+            data_json = json.dumps(data, default=_json_default).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            data_json = json.dumps({"error": str(e)}).encode('utf-8')
+
+        with self._cond:
+            self._data_json = data_json
+            self._data_seq += 1
+            self._cond.notify_all()
+
+            if self.viewers == 0:
+                return
+            if self._pending >= self.workers:
+                self.frames_dropped += 1
+                return
+            self._pending += 1
+            buf = self._free_bufs.pop() if self._free_bufs else None
+
+        if buf is None or buf.shape != frame.shape:
+            buf = np.empty_like(frame)
+        np.copyto(buf, frame)
+        self._executor.submit(self._encode, buf, frame_id)
+
+    def _encode(self, buf, frame_id):
+        try:
+            img = buf
+            h, w = buf.shape[:2]
+            if self.max_width and w > self.max_width:
+                img = cv2.resize(buf, (self.max_width, int(h * self.max_width / w)),
+                                 interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            with self._cond:
+                # Encoders can finish out of order; never step back to an older frame
+                if ok and frame_id > self._jpeg_id:
+                    self._jpeg, self._jpeg_id = jpeg.tobytes(), frame_id
+                    self._jpeg_seq += 1
+                    self.frames_encoded += 1
+                    self._cond.notify_all()
+        except Exception as e:
+            print(f"Dashboard encode error: {e}")
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._free_bufs.append(buf)
+
+    def _wait_newer(self, attr, last_seq, timeout=1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: getattr(self, attr) != last_seq or not self._running,
+                                timeout=timeout)
+            return getattr(self, attr)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass  # keep the console for session output
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                path = url.path
+                try:
+                    if server.token:
+                        given = parse_qs(url.query).get("token", [""])[0]
+                        if not hmac.compare_digest(given.encode('utf-8'), server.token.encode('utf-8')):
+                            self._send(403, "text/plain", b"forbidden")
+                            return
+                    if path in ("/", "/index.html"):
+                        self._send(200, "text/html; charset=utf-8", _DASHBOARD_PAGE)
+                    elif path == "/data.json":
+                        self._send(200, "application/json", server._data_json)
+                    elif path == "/stream.mjpg":
+                        self._stream_mjpeg()
+                    elif path == "/events":
+                        self._stream_events()
+                    else:
+                        self._send(404, "text/plain", b"not found")
+                except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+                    pass
+
+            def _send(self, code, ctype, body):
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream_mjpeg(self):
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={server.BOUNDARY}")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                with server._cond:
+                    server.viewers += 1
+                try:
+                    last_seq = 0
+                    while server._running:
+                        seq = server._wait_newer("_jpeg_seq", last_seq)
+                        if seq == last_seq:
+                            continue
+                        last_seq = seq
+                        jpeg = server._jpeg
+                        self.wfile.write(f"--{server.BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode('ascii'))
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                finally:
+                    with server._cond:
+                        server.viewers -= 1
+
+            def _stream_events(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                last_seq = 0
+                while server._running:
+                    seq = server._wait_newer("_data_seq", last_seq)
+                    if seq == last_seq:
+                        continue
+                    last_seq = seq
+                    self.wfile.write(b"data: " + server._data_json + b"\n\n")
+                    self.wfile.flush()
+
+        return Handler
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._executor.shutdown(wait=False)
+
+
+class SessionRecorder:
+    """Records the annotated session to video without slowing the video loop.
+
+    The loop only copies frames into pooled buffers and puts them on a
+    bounded queue. A background thread resizes and encodes them with
+    cv2.VideoWriter, so encoding never runs inside run(). When the queue
+    is full the frame is dropped and counted instead of blocking the loop.
+
+    Every `fps_divisor`-th frame is offered to the recorder. The output
+    runs at fps / fps_divisor and a new segment is started every
+    `segment_sec` seconds. Video time follows the capture clock: gaps
+    left by dropped frames are filled by repeating the last frame, and
+    frames that arrive faster than the output rate are skipped. Each
+    segment gets a JSONL sidecar with one row per written frame, holding
+    its video frame index and time, capture time, frame id, the
+    analyze_form data, the pose landmarks and the frame id the pose was
+    estimated on (asynchronous backends repeat a pose over several frames).
+    """
+    MAX_PAD_FRAMES = 90  # never fill more than this many frames for one gap
+
+    def __init__(self, folder="session_recordings", fps=30, fps_divisor=1, size=None,
+                 segment_sec=300, record_raw=False, max_queue=32, fourcc="mp4v"):
+        self.folder = folder
+        self.fps_divisor = max(1, int(fps_divisor))
+        self.out_fps = fps / self.fps_divisor
+        self.size = size  # (width, height) or None for the frame size
+        self.segment_sec = segment_sec
+        self.record_raw = record_raw
+        self.fourcc = fourcc
+        self.session_name = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.q = queue.Queue(maxsize=max_queue)
+        self._free = []
+        self._free_lock = threading.Lock()
+        self._offered = 0
+
+        # Stats for the session summary
+        self.frames_written = 0
+        self.frames_dropped = 0   # queue full (encoder behind)
+        self.frames_padded = 0    # repeats written to keep video time aligned
+        self.frames_skipped = 0   # arrived faster than the output frame rate
+        self.segments = []
+
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self._thread = threading.Thread(target=self._worker, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, fps):
+        size = os.environ.get('PHYSIO_RECORD_SIZE')  # e.g. 640x360
+        return cls(fps=fps,
+                   fps_divisor=int(os.environ.get('PHYSIO_RECORD_FPS_DIV', 1)),
+                   size=tuple(int(v) for v in size.lower().split('x')) if size else None,
+                   segment_sec=float(os.environ.get('PHYSIO_RECORD_SEGMENT_SEC', 300)),
+                   record_raw=env_flag('PHYSIO_RECORD_RAW', False),
+                   max_queue=int(os.environ.get('PHYSIO_RECORD_QUEUE', 32)),
+                   fourcc=os.environ.get('PHYSIO_RECORD_FOURCC', 'mp4v'))
+
+    def accepts_frame(self):
+        """Called once per loop frame; True if this frame should be recorded."""
+        self._offered += 1
+        if (self._offered - 1) % self.fps_divisor:
+            return False
+        if self.q.full():
+            self.frames_dropped += 1
+            return False
+        return True
+
+    def copy_frame(self, frame):
+        """Copies a frame into a pooled buffer (the loop reuses its own buffers)."""
+        with self._free_lock:
+            buf = self._free.pop() if self._free else None
+        if buf is None or buf.shape != frame.shape:
+            buf = np.empty_like(frame)
+        np.copyto(buf, frame)
+        return buf
+
+    def _release(self, *bufs):
+        with self._free_lock:
+            self._free.extend(b for b in bufs if b is not None)
+
+    def submit(self, annotated, raw, capture_ts, frame_id, data, poses, pose_frame_id=None):
+        """Queues a frame accepted by accepts_frame(); never blocks."""
+        row = {"frame_id": frame_id, "capture_ts": capture_ts, "wall_time": time.time(),
+               "data": data, "pose_frame_id": pose_frame_id,
+               "poses": [[[lm.x, lm.y, lm.z, getattr(lm, 'visibility', None) or 0.0] for lm in landmarks]
+                         for landmarks in (poses or [])]}
+        item = (self.copy_frame(annotated), raw, capture_ts, row)
+        try:
+            self.q.put_nowait(item)
+        except queue.Full:
+            self.frames_dropped += 1
+            self._release(item[0], raw)
+
+    def _open_segment(self, frame_shape, start_ts):
+        h, w = frame_shape[:2]
+        size = self.size or (w, h)
+        base = os.path.join(self.folder, f"{self.session_name}_seg{len(self.segments) + 1:03d}")
+        fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+        segment = {
+            "start_ts": start_ts, "next_index": 0, "size": size, "last": None, "last_raw": None,
+            "video": cv2.VideoWriter(base + ".mp4", fourcc, self.out_fps, size),
+            "raw": cv2.VideoWriter(base + "_raw.mp4", fourcc, self.out_fps, size) if self.record_raw else None,
+            "sidecar": open(base + ".jsonl", 'w', encoding='utf-8'),
+        }
+        self.segments.append(base)
+        print(f"Recording segment -> {base}.mp4")
+        return segment
+
+    def _close_segment(self, segment):
+        if segment is None:
+            return
+        segment["video"].release()
+        if segment["raw"] is not None:
+            segment["raw"].release()
+        segment["sidecar"].close()
+
+    def _fit(self, frame, size):
+        if (frame.shape[1], frame.shape[0]) == size:
+            return frame
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def _worker(self):
+        segment = None
+        while True:
+            item = self.q.get()
+            if item is None:
+                break
+            annotated, raw, capture_ts, row = item
+            try:
+                if segment is None or capture_ts - segment["start_ts"] >= self.segment_sec:
+                    self._close_segment(segment)
+                    segment = self._open_segment(annotated.shape, capture_ts)
+
+                target = int(round((capture_ts - segment["start_ts"]) * self.out_fps))
+                if target < segment["next_index"]:
+                    self.frames_skipped += 1
+                    continue
+                # Repeat the previous frame over gaps so video time matches capture time
+                pad = min(target - segment["next_index"], self.MAX_PAD_FRAMES)
+                if segment["last"] is not None:
+                    for _ in range(pad):
+                        segment["video"].write(segment["last"])
+                        if segment["raw"] is not None and segment["last_raw"] is not None:
+                            segment["raw"].write(segment["last_raw"])
+                    self.frames_padded += pad
+                    segment["next_index"] += pad
+
+                video_frame = self._fit(annotated, segment["size"])
+                segment["video"].write(video_frame)
+                segment["last"] = video_frame.copy() if video_frame is annotated else video_frame
+                if segment["raw"] is not None and raw is not None:
+                    raw_frame = self._fit(raw, segment["size"])
+                    segment["raw"].write(raw_frame)
+                    segment["last_raw"] = raw_frame.copy() if raw_frame is raw else raw_frame
+
+                row["video_frame"] = segment["next_index"]
+                row["video_time"] = round(segment["next_index"] / self.out_fps, 4)
+                row["capture_offset"] = round(capture_ts - segment["start_ts"], 4)
+                segment["sidecar"].write(json.dumps(row, default=_json_default) + "\n")
+                segment["next_index"] += 1
+                self.frames_written += 1
+            except Exception as e:
+                print(f"Recorder error: {e}")
+            finally:
+                self._release(annotated, raw)
+        self._close_segment(segment)
+
+    def stop(self):
+        """Finishes encoding whatever is queued and closes the files."""
+        self.q.put(None)
+        self._thread.join(timeout=30.0)
+
+
 class VibrationClient:
     """Non-blocking vibration sender.
 
@@ -23,8 +530,9 @@ class VibrationClient:
     send JSON POSTs to the ESP32 endpoint `/vibrate`. Queueing ensures
     the main (video) thread never blocks on network I/O.
     """
-    def __init__(self, host='http://esp32-haptic.local', max_queue=50):
+    def __init__(self, host='http://esp32-haptic.local', max_queue=50, tracer=None):
         self.base = host.rstrip('/')
+        self.tracer = tracer
         self.url = f"{self.base}/vibrate"
         self.session = requests.Session()
         self.q = queue.Queue()
@@ -33,12 +541,13 @@ class VibrationClient:
         self._thread = threading.Thread(target=self._worker, daemon=True)
         self._thread.start()
 
-    def vibrate(self, side='BOTH', duration_ms=200, intensity=255):
+    def vibrate(self, side='BOTH', duration_ms=200, intensity=255, trace_ctx=None):
         """Queue a vibration command. Non-blocking.
 
         side: 'LEFT', 'RIGHT', or 'BOTH'
         duration_ms: integer ms
         intensity: 0-255
+        trace_ctx: optional (frame_id, capture_ts, enqueue_ts, flow_id) for tracing
         """
         if not self._running:
             return
@@ -59,12 +568,13 @@ class VibrationClient:
             "duration_ms": int(duration_ms),
             "intensity": int(intensity)
         }
+        item = (payload, trace_ctx)
         try:
-            self.q.put_nowait(payload)
+            self.q.put_nowait(item)
         except Exception:
             # fallback: try blocking put (shouldn't happen often)
             try:
-                self.q.put(payload, timeout=0.01)
+                self.q.put(item, timeout=0.01)
             except Exception:
                 pass
 
@@ -86,9 +596,21 @@ class VibrationClient:
                 item = self.q.get(timeout=0.05)
                 if item is None:
                     break
+                payload, trace_ctx = item
                 try:
                     # short timeout so a failed send doesn't hang
-                    self.session.post(self.url, json=item, timeout=0.5)
+                    post_start = time.perf_counter()
+                    self.session.post(self.url, json=payload, timeout=0.5)
+                    if trace_ctx and self.tracer:
+                        frame_id, capture_ts, enqueue_ts, flow_id = trace_ctx
+                        post_end = time.perf_counter()
+                        self.tracer.flow("feedback", flow_id, post_start, start=False)
+                        self.tracer.complete("haptic.queue_wait", enqueue_ts, post_start,
+                                             cat="haptic", frame_id=frame_id)
+                        self.tracer.complete("haptic.post", post_start, post_end,
+                                             cat="haptic", frame_id=frame_id, side=payload["side"])
+                        self.tracer.async_span("capture_to_haptic", capture_ts, post_end, flow_id,
+                                               frame_id=frame_id, side=payload["side"])
                 except Exception as e:
                     # keep going; we don't want to block the main process
                     print(f"Vibration send error: {e}")
@@ -99,18 +621,1004 @@ class VibrationClient:
                 continue
 
 
+class FramePreprocessor:
+    """Mirror + BGR->RGB conversion into reusable destination buffers.
+
+    With `preallocate` the flip and colour conversion write into buffers
+    that are only (re)allocated when the frame shape changes, so the
+    steady-state loop does no per-frame image allocations. With
+    `flip=False` the image is left as-is; landmarks then stay in image
+    coordinates and only the LEFT/RIGHT side labels are swapped.
+
+    The returned arrays are owned by the preprocessor and are overwritten
+    on the next call; copy them before handing them to another thread.
+    """
+    def __init__(self, flip=True, preallocate=True):
+        self.flip = flip
+        self.preallocate = preallocate
+        self._flip_buf = None
+        self._rgb_buf = None
+
+        # Stats for the session summary
+        self.frames = 0
+        self.allocations = 0
+        self.total_time = 0.0
+
+    def _ensure(self, buf, like):
+        if buf is None or buf.shape != like.shape or buf.dtype != like.dtype:
+            self.allocations += 1
+            return np.empty_like(like)
+        return buf
+
+    def process(self, frame, need_rgb=True):
+        """Returns (display_frame, rgb_frame) for a BGR camera frame.
+
+        With need_rgb=False (no pose inference this frame) only the display
+        frame is produced and rgb_frame is None.
+        """
+        t0 = time.perf_counter()
+        rgb_frame = None
+        if self.preallocate:
+            if self.flip:
+                self._flip_buf = self._ensure(self._flip_buf, frame)
+                cv2.flip(frame, 1, dst=self._flip_buf)
+                frame = self._flip_buf
+            if need_rgb:
+                self._rgb_buf = self._ensure(self._rgb_buf, frame)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+                rgb_frame = self._rgb_buf
+        else:
+            # Legacy path: fresh arrays every frame (kept for comparison)
+            if self.flip:
+                frame = cv2.flip(frame, 1)
+                self.allocations += 1
+            if need_rgb:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                self.allocations += 1
+
+        self.total_time += time.perf_counter() - t0
+        self.frames += 1
+        return frame, rgb_frame
+
+    def avg_time_ms(self):
+        return (self.total_time / self.frames) * 1000 if self.frames else 0.0
+
+    def allocs_per_frame(self):
+        """Image buffers created per frame, as counted by this class (see bench_preprocessing for a measurement)."""
+        return self.allocations / self.frames if self.frames else 0.0
+
+
+class MotionGate:
+    """Cheap motion detector used while the kiosk is idle.
+
+    Each frame is shrunk to a tiny grey image (64x36 by default) and
+    compared with the previous one. Motion means more than
+    `min_changed` of the pixels changed by more than `pixel_threshold`
+    grey levels. All intermediate images are preallocated, so a check
+    costs a fraction of a millisecond instead of a pose model pass.
+    """
+    def __init__(self, size=(64, 36), pixel_threshold=20, min_changed=0.01):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        w, h = size
+        self._small = np.empty((h, w, 3), dtype=np.uint8)
+        self._grey = np.empty((h, w), dtype=np.uint8)
+        self._prev = np.empty((h, w), dtype=np.uint8)
+        self._diff = np.empty((h, w), dtype=np.uint8)
+        self._has_prev = False
+        self.last_changed = 0.0
+
+    def reset(self):
+        self._has_prev = False
+
+    def update(self, frame):
+        """Returns True if `frame` (BGR) differs enough from the previous one."""
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._grey)
+        if not self._has_prev:
+            self._grey, self._prev = self._prev, self._grey
+            self._has_prev = True
+            return False
+        cv2.absdiff(self._grey, self._prev, dst=self._diff)
+        cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+        self.last_changed = cv2.countNonZero(self._diff) / self._diff.size
+        self._grey, self._prev = self._prev, self._grey
+        return self.last_changed > self.min_changed
+
+
+def env_flag(name, default):
+    """Reads a boolean switch such as PHYSIO_FLIP=0 from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def matching_log_path(path, headers):
+    """Returns a CSV path whose header is `headers`, so appended rows line up.
+
+    Uses `path` if it is new or already has this header; otherwise the
+    first of path_2.csv, path_3.csv, ... that is new or matches. Logs
+    written with an older set of columns are left untouched.
+    """
+    base, ext = os.path.splitext(path)
+    candidate, version = path, 1
+    while os.path.isfile(candidate):
+        try:
+            with open(candidate, newline='', encoding='utf-8') as f:
+                if next(csv.reader(f), None) == headers:
+                    break
+        except (IOError, UnicodeDecodeError):
+            pass
+        version += 1
+        candidate = f"{base}_{version}{ext}"
+    return candidate
+
+
+class CaptureSource:
+    """Frame source for cameras, video files and image sequences.
+
+    Cameras are drained by a background grabber thread that always keeps
+    the newest frame, so `read()` never hands back a frame that sat in the
+    driver queue while inference was busy. Files and image sequences
+    (e.g. 'clip.mp4' or 'frames/img_%04d.png') are read in order on the
+    calling thread so every frame is processed.
+
+    `read()` returns (ok, frame, capture_ts, frame_id). capture_ts is a
+    time.perf_counter() timestamp taken right after the frame was grabbed;
+    the frame buffer stays valid until the next `read()`. Like
+    cv2.VideoCapture.read(), a camera read waits through stalls and only
+    fails once the camera stops delivering frames.
+    """
+    BACKENDS = {
+        "any": cv2.CAP_ANY,
+        "dshow": cv2.CAP_DSHOW,
+        "msmf": cv2.CAP_MSMF,
+        "v4l2": cv2.CAP_V4L2,
+        "avfoundation": cv2.CAP_AVFOUNDATION,
+        "ffmpeg": cv2.CAP_FFMPEG,
+        "gstreamer": cv2.CAP_GSTREAMER,
+        "images": cv2.CAP_IMAGES,
+    }
+
+    def __init__(self, source=0, backend="any", fourcc=None, buffer_size=1,
+                 width=1280, height=720, fps=30, latest_only=None):
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        self.source = source
+        self.is_camera = isinstance(source, int)
+        self.latest_only = self.is_camera if latest_only is None else latest_only
+
+        api = self.BACKENDS.get(str(backend).lower(), cv2.CAP_ANY)
+        self.cap = cv2.VideoCapture(source, api)
+
+        if self.is_camera and self.cap.isOpened():
+            # FOURCC has to be set before the resolution on most drivers
+            if fourcc:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc[:4].ljust(4)))
+            if buffer_size:
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, int(buffer_size))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+        self._frame_id = 0
+        self._frame = None
+
+        # Latest-frame grabber state: three buffers so the grabber can write
+        # one while the consumer holds another and a third is published.
+        self._bufs = [None, None, None]
+        self._latest = -1
+        self._in_use = -1
+        self._latest_ts = 0.0
+        self._latest_id = 0
+        self._last_returned_id = 0
+        self.frames_skipped = 0  # frames superseded before they were read
+        self._grab_ok = True
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        if self.latest_only and self.cap.isOpened():
+            self._running = True
+            self._thread = threading.Thread(target=self._grabber, daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_env(cls):
+        """Builds a source from PHYSIO_SOURCE / PHYSIO_CAP_* variables."""
+        buffer_size = os.environ.get('PHYSIO_CAP_BUFFERSIZE', '1')
+        return cls(source=os.environ.get('PHYSIO_SOURCE', '0'),
+                   backend=os.environ.get('PHYSIO_CAP_BACKEND', 'any'),
+                   fourcc=os.environ.get('PHYSIO_CAP_FOURCC') or None,
+                   buffer_size=int(buffer_size) if buffer_size else 0,
+                   width=int(os.environ.get('PHYSIO_CAP_WIDTH', 1280)),
+                   height=int(os.environ.get('PHYSIO_CAP_HEIGHT', 720)),
+                   fps=int(os.environ.get('PHYSIO_CAP_FPS', 30)))
+
+    def is_opened(self):
+        if self.latest_only:
+            with self._cond:
+                return self._grab_ok and self.cap.isOpened()
+        return self.cap.isOpened()
+
+    def _grabber(self):
+        while self._running:
+            with self._cond:
+                idx = next(i for i in range(3) if i != self._latest and i != self._in_use)
+            ret, img = self.cap.read(self._bufs[idx])
+            ts = time.perf_counter()
+            with self._cond:
+                if not ret:
+                    self._grab_ok = False
+                    self._cond.notify_all()
+                    break
+                self._bufs[idx] = img
+                self._latest = idx
+                self._latest_ts = ts
+                self._latest_id += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=None, stall_warning=1.0):
+        """Next frame; with `timeout` (seconds) a camera read gives up after that long."""
+        if not self.latest_only:
+            ret, img = self.cap.read(self._frame)
+            if not ret:
+                return False, None, 0.0, self._frame_id
+            self._frame = img
+            self._frame_id += 1
+            return True, img, time.perf_counter(), self._frame_id
+
+        with self._cond:
+            # Release the previous buffer before waiting so the grabber can reuse it
+            self._in_use = -1
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            step = stall_warning if timeout is None else min(stall_warning, timeout)
+            stalled = False
+            while not self._cond.wait_for(
+                    lambda: self._latest_id > self._last_returned_id or not self._grab_ok or not self._running,
+                    timeout=step):
+                # Slow first frame, exposure change, USB hiccup: keep waiting unless told not to
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return False, None, 0.0, self._last_returned_id
+                if not stalled:
+                    print("Warning: camera stalled, waiting for frames...")
+                    stalled = True
+            if self._latest_id == self._last_returned_id:
+                return False, None, 0.0, self._last_returned_id
+            self._in_use = self._latest
+            self.frames_skipped += self._latest_id - self._last_returned_id - 1
+            self._last_returned_id = self._latest_id
+            return True, self._bufs[self._in_use], self._latest_ts, self._latest_id
+
+    def release(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.cap.release()
+
+
+
+class PoseResult:
+    """Pose estimate for one frame: `poses` is a list of landmark lists.
+
+    capture_ts is the capture time of the frame the pose was estimated
+    on; latency is that frame's submit -> result time in seconds.
+    """
+    __slots__ = ("frame_id", "capture_ts", "poses", "latency")
+
+    def __init__(self, frame_id, capture_ts, poses, latency=0.0):
+        self.frame_id = frame_id
+        self.capture_ts = capture_ts
+        self.poses = poses
+        self.latency = latency
+
+    @property
+    def landmarks(self):
+        """Landmarks of the first (or only) person, or None."""
+        return self.poses[0] if self.poses else None
+
+
+class PoseBackend:
+    """Interface between run() and a pose estimator.
+
+    `process(rgb_frame, frame_id, timestamp)` takes an RGB frame and
+    returns the most recent PoseResult available, or None before the
+    first result. Synchronous backends return the result for the frame
+    just passed in. Asynchronous backends return the newest result that
+    has completed, which may belong to an earlier frame, and callers use
+    `PoseResult.frame_id` and `capture_ts` to tell new results from
+    repeats and to know which frame a result describes.
+
+    Landmarks have x, y, z and visibility attributes, normalized to the
+    frame that was passed in.
+    """
+    name = "base"
+    asynchronous = False  # True if results may belong to an earlier frame
+
+    def __init__(self):
+        self.latencies = []  # submit -> result, seconds
+        self.results = 0
+        self.last_result_time = 0.0
+        self.worker_cpu = 0.0  # CPU seconds used by helper processes (not in time.process_time())
+
+    def process(self, rgb_frame, frame_id, timestamp):
+        raise NotImplementedError
+
+    def _finish(self, frame_id, capture_ts, submit, poses):
+        self.last_result_time = time.perf_counter()
+        latency = self.last_result_time - submit
+        self.latencies.append(latency)
+        self.results += 1
+        return PoseResult(frame_id, capture_ts, poses, latency)
+
+    def drain(self, timeout=0.5):
+        """Waits up to `timeout` s for results still in flight; synchronous backends have none."""
+        pass
+
+    def close(self):
+        pass
+
+
+class SolutionsPoseBackend(PoseBackend):
+    """Legacy `mp.solutions.pose.Pose`; single person, blocks until done."""
+    name = "solutions"
+
+    def __init__(self, model_complexity=1, min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5):
+        super().__init__()
+        self.pose = mp.solutions.pose.Pose(static_image_mode=False, model_complexity=model_complexity,
+                                           enable_segmentation=False,
+                                           min_detection_confidence=min_detection_confidence,
+                                           min_tracking_confidence=min_tracking_confidence)
+
+    def process(self, rgb_frame, frame_id, timestamp):
+        submit = time.perf_counter()
+        result = self.pose.process(rgb_frame)
+        poses = [list(result.pose_landmarks.landmark)] if result.pose_landmarks else []
+        return self._finish(frame_id, timestamp, submit, poses)
+
+    def close(self):
+        self.pose.close()
+
+
+class TasksPoseBackend(PoseBackend):
+    """MediaPipe Tasks `PoseLandmarker` in LIVE_STREAM mode.
+
+    `detect_async` returns immediately and results arrive on MediaPipe's
+    own thread, so detection of frame N overlaps capture and drawing of
+    frame N+1. MediaPipe drops frames internally while the graph is busy.
+    Needs a model bundle, e.g. pose_landmarker_full.task from the
+    MediaPipe model zoo (path in PHYSIO_POSE_MODEL).
+    """
+    name = "tasks"
+    asynchronous = True
+
+    def __init__(self, model_path="pose_landmarker_full.task", num_poses=1,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        super().__init__()
+        vision = mp.tasks.vision
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_path),
+            running_mode=vision.RunningMode.LIVE_STREAM,
+            num_poses=num_poses,
+            min_pose_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+            result_callback=self._on_result)
+        self._lock = threading.Lock()
+        self._inflight = {}  # timestamp_ms -> (frame_id, capture time, submit time)
+        self._latest = None
+        self._last_ts_ms = -1
+        self.landmarker = vision.PoseLandmarker.create_from_options(options)
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        with self._lock:
+            now = time.perf_counter()
+            frame_id, capture_ts, submit = self._inflight.pop(timestamp_ms, (0, now, now))
+            # Anything older than this result was dropped by the graph
+            for ts in [ts for ts in self._inflight if ts < timestamp_ms]:
+                del self._inflight[ts]
+            self._latest = self._finish(frame_id, capture_ts, submit, list(result.pose_landmarks))
+
+    def process(self, rgb_frame, frame_id, timestamp):
+        # LIVE_STREAM needs strictly increasing timestamps
+        ts_ms = max(int(timestamp * 1000), self._last_ts_ms + 1)
+        self._last_ts_ms = ts_ms
+        # mp.Image copies the pixels, so the caller may reuse rgb_frame straight away
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+        with self._lock:
+            self._inflight[ts_ms] = (frame_id, timestamp, time.perf_counter())
+        self.landmarker.detect_async(image, ts_ms)
+        with self._lock:
+            return self._latest
+
+    def drain(self, timeout=0.5):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if not self._inflight:
+                    return
+            time.sleep(0.005)
+
+    def close(self):
+        self.landmarker.close()
+
+
+class Landmark:
+    """Plain landmark carrying the attributes analyze_form reads."""
+    __slots__ = ("x", "y", "z", "visibility")
+
+    def __init__(self, x, y, z, visibility):
+        self.x, self.y, self.z, self.visibility = x, y, z, visibility
+
+
+NUM_POSE_LANDMARKS = 33
+
+
+def _pose_worker(frame_shm_name, result_shm_name, slots, slot_bytes, model_complexity,
+                 requests_q, responses_q):
+    """Child-process loop for ProcessPoseBackend.
+
+    Frames are read straight out of the shared ring and landmarks are
+    written back as a fixed (33, 4) float32 block per slot; only small
+    (slot, frame_id, ...) tuples travel through the queues. Each response
+    carries the child's CPU time so the parent can account for it.
+    """
+    frame_shm = shared_memory.SharedMemory(name=frame_shm_name)
+    result_shm = shared_memory.SharedMemory(name=result_shm_name)
+    results = np.ndarray((slots, NUM_POSE_LANDMARKS, 4), dtype=np.float32, buffer=result_shm.buf)
+    pose = mp.solutions.pose.Pose(static_image_mode=False, model_complexity=model_complexity,
+                                  enable_segmentation=False, min_detection_confidence=0.5,
+                                  min_tracking_confidence=0.5)
+    rgb_frame = None
+    responses_q.put(("ready", time.process_time()))
+    try:
+        while True:
+            request = requests_q.get()
+            if request is None:
+                break
+            slot, frame_id, h, w = request
+            rgb_frame = np.ndarray((h, w, 3), dtype=np.uint8, buffer=frame_shm.buf,
+                                   offset=slot * slot_bytes)
+            result = pose.process(rgb_frame)
+            found = result.pose_landmarks is not None
+            if found:
+                for i, lm in enumerate(result.pose_landmarks.landmark[:NUM_POSE_LANDMARKS]):
+                    results[slot, i] = (lm.x, lm.y, lm.z, lm.visibility)
+            responses_q.put((slot, frame_id, found, time.process_time()))
+    finally:
+        pose.close()
+        del rgb_frame, results
+        frame_shm.close()
+        result_shm.close()
+
+
+class ProcessPoseBackend(PoseBackend):
+    """Runs the solutions Pose model in a dedicated child process.
+
+    Keeps MediaPipe, and the GIL time spent around it, out of the
+    process that runs the video loop and the audio/haptic threads.
+    Frames are copied into a `multiprocessing.shared_memory` ring of
+    preallocated slots, sized for 1280x720 by default and grown if a
+    larger frame arrives. Landmarks come back through a second shared
+    block, so frames are never pickled.
+
+    By default `process()` waits for the frame it submitted. With
+    `pipelined=True` it returns the newest finished result, so inference
+    of frame N overlaps the loop's work on frame N+1. If every slot is
+    still busy, the frame is skipped.
+
+    If the worker dies, its in-flight frames and last result are dropped
+    (a stale pose is never returned) and a new worker is started, up to
+    `max_restarts` times; after that process() raises RuntimeError.
+    """
+    name = "process"
+
+    def __init__(self, model_complexity=1, slots=3, frame_shape=(720, 1280, 3),
+                 pipelined=False, timeout=5.0, max_restarts=3):
+        super().__init__()
+        self.model_complexity = model_complexity
+        self.slots = slots
+        self.pipelined = pipelined
+        self.asynchronous = pipelined
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._proc = None
+        self._latest = None
+        self.frames_skipped = 0
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self._start(int(np.prod(frame_shape)))
+
+    def _start(self, slot_bytes):
+        self.slot_bytes = slot_bytes
+        self._frame_shm = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+        self._result_shm = shared_memory.SharedMemory(
+            create=True, size=self.slots * NUM_POSE_LANDMARKS * 4 * 4)
+        self._results = np.ndarray((self.slots, NUM_POSE_LANDMARKS, 4), dtype=np.float32,
+                                   buffer=self._result_shm.buf)
+        self._requests = self._ctx.Queue()
+        self._responses = self._ctx.Queue()
+        self._inflight = {}  # slot -> (frame_id, capture time, submit time)
+        self._proc = self._ctx.Process(
+            target=_pose_worker, name="pose-worker", daemon=True,
+            args=(self._frame_shm.name, self._result_shm.name, self.slots, slot_bytes,
+                  self.model_complexity, self._requests, self._responses))
+        self._proc.start()
+        # Model load happens in the child; wait so the first frame isn't timed against it
+        ready = self._responses.get(timeout=60)
+        if ready[0] != "ready":
+            raise RuntimeError("pose worker failed to start")
+        # worker_cpu counts from here on; model load is left out, as it is for in-process backends
+        self._cpu_done, self._cpu_base = self.worker_cpu, ready[1]
+
+    def _worker_died(self):
+        """Drops everything the dead worker owed us and starts a new one."""
+        self._inflight, self._latest = {}, None
+        self.close()
+        self.restarts += 1
+        if self.restarts > self.max_restarts:
+            raise RuntimeError(f"pose worker died {self.restarts} times; giving up")
+        print("Warning: pose worker died - restarting it")
+        self._start(self.slot_bytes)
+
+    def _next_response(self, wait):
+        """Next (slot, frame_id, found, cpu) from the worker; None if none is ready, it timed out or died."""
+        deadline = time.perf_counter() + self.timeout
+        while True:
+            try:
+                return self._responses.get(timeout=0.1) if wait else self._responses.get_nowait()
+            except queue.Empty:
+                if not self._proc.is_alive():
+                    self._worker_died()
+                    return None
+                if not wait:
+                    return None
+                if time.perf_counter() >= deadline:
+                    print("Warning: pose worker timed out")
+                    return None
+
+    def _collect(self, block_for=None):
+        """Reads finished slots; with block_for, waits until that slot is back."""
+        while self._inflight:
+            response = self._next_response(block_for is not None and block_for in self._inflight)
+            if response is None:
+                return
+            slot, frame_id, found, cpu = response
+            self.worker_cpu = self._cpu_done + cpu - self._cpu_base
+            _, capture_ts, submit = self._inflight.pop(slot)
+            poses = []
+            if found:
+                # Copy out of the shared block before the slot is reused
+                poses = [[Landmark(*(float(v) for v in row)) for row in self._results[slot]]]
+            result = self._finish(frame_id, capture_ts, submit, poses)
+            if self._latest is None or frame_id > self._latest.frame_id:
+                self._latest = result
+            if block_for is not None and block_for not in self._inflight:
+                return
+
+    def process(self, rgb_frame, frame_id, timestamp):
+        if rgb_frame.nbytes > self.slot_bytes:
+            print(f"Pose worker: growing frame slots to {rgb_frame.shape}")
+            self.close()
+            self._start(rgb_frame.nbytes)
+
+        self._collect()
+        if not self._proc.is_alive():
+            self._worker_died()
+        free = [i for i in range(self.slots) if i not in self._inflight]
+        if not free:
+            self.frames_skipped += 1
+            return self._latest
+        slot = free[0]
+        h, w = rgb_frame.shape[:2]
+        view = np.ndarray((h, w, 3), dtype=np.uint8, buffer=self._frame_shm.buf,
+                          offset=slot * self.slot_bytes)
+        np.copyto(view, rgb_frame)
+        del view
+        self._inflight[slot] = (frame_id, timestamp, time.perf_counter())
+        self._requests.put((slot, frame_id, h, w))
+
+        if not self.pipelined:
+            self._collect(block_for=slot)
+        return self._latest
+
+    def drain(self, timeout=0.5):
+        for slot in list(self._inflight):
+            self._collect(block_for=slot)
+
+    def close(self):
+        if self._proc is None:
+            return
+        try:
+            self._requests.put(None)
+            self._proc.join(timeout=2.0)
+        finally:
+            if self._proc.is_alive():
+                self._proc.terminate()
+            self._proc = None
+            self._results = None
+            self._frame_shm.close()
+            self._frame_shm.unlink()
+            self._result_shm.close()
+            self._result_shm.unlink()
+
+
+POSE_BACKENDS = {
+    "solutions": SolutionsPoseBackend,
+    "tasks": TasksPoseBackend,
+    "process": ProcessPoseBackend,
+}
+
+
+def make_pose_backend(name=None, **kwargs):
+    """Creates the pose backend chosen by name or PHYSIO_POSE_BACKEND (default 'solutions')."""
+    name = (name or os.environ.get('PHYSIO_POSE_BACKEND', 'solutions')).lower()
+    if name not in POSE_BACKENDS:
+        raise ValueError(f"Unknown pose backend '{name}' (choose from {', '.join(POSE_BACKENDS)})")
+    if name == "tasks":
+        kwargs.setdefault("model_path", os.environ.get('PHYSIO_POSE_MODEL', 'pose_landmarker_full.task'))
+    elif name == "process" and "pipelined" not in kwargs:
+        kwargs["pipelined"] = env_flag('PHYSIO_POSE_PIPELINE', False)
+    if name != "tasks" and kwargs.pop("num_poses", 1) > 1:
+        raise ValueError(f"Pose backend '{name}' detects a single person; use PHYSIO_POSE_BACKEND=tasks for groups")
+    return POSE_BACKENDS[name](**kwargs)
+
+
+class WristRefiner:
+    """Refines the wrist-extension angle with a hand model run on a small crop.
+
+    The body model's wrist and index-knuckle points are coarse. While
+    `wristext` is active, this crops a square around the tracked wrist,
+    sized from the forearm length and shifted towards the hand. It runs
+    MediaPipe Hands on that crop only and returns the hand model's own
+    wrist (0) and index MCP (5) landmarks in full-frame normalized
+    coordinates. The hand model is loaded on first use or by `load()`.
+
+    Asynchronous pose backends return poses of earlier frames. For those,
+    `keep_frame()` holds copies of the last `keep_frames` submitted RGB
+    frames so the crop is taken from the frame the pose belongs to.
+    """
+    HAND_WRIST, HAND_INDEX_MCP = 0, 5
+
+    def __init__(self, crop_scale=1.6, min_crop=128, model_complexity=0, min_confidence=0.5,
+                 keep_frames=8):
+        self.crop_scale = crop_scale
+        self.min_crop = min_crop
+        self.model_complexity = model_complexity
+        self.min_confidence = min_confidence
+        self.keep_frames = keep_frames
+        self.hands = None
+        self._frames = collections.OrderedDict()  # frame_id -> RGB copy, oldest first
+
+        # Stats for the session summary
+        self.calls = 0
+        self.refined = 0
+        self.total_time = 0.0
+
+    def keep_frame(self, frame_id, rgb_frame):
+        """Copies a frame handed to an asynchronous backend, reusing the oldest buffer."""
+        buf = None
+        if len(self._frames) >= self.keep_frames:
+            _, buf = self._frames.popitem(last=False)
+        if buf is None or buf.shape != rgb_frame.shape:
+            buf = np.empty_like(rgb_frame)
+        np.copyto(buf, rgb_frame)
+        self._frames[frame_id] = buf
+
+    def frame_for(self, frame_id):
+        """The kept RGB frame for frame_id, or None if it was never kept or has been reused."""
+        return self._frames.get(frame_id)
+
+    def load(self):
+        """Loads the hand model now instead of on the first refined frame."""
+        if self.hands is None:
+            self.hands = mp.solutions.hands.Hands(static_image_mode=False, max_num_hands=1,
+                                                  model_complexity=self.model_complexity,
+                                                  min_detection_confidence=self.min_confidence,
+                                                  min_tracking_confidence=self.min_confidence)
+            # One pass on a blank crop so graph start-up isn't charged to a real frame
+            self.hands.process(np.zeros((self.min_crop, self.min_crop, 3), dtype=np.uint8))
+
+    def refine(self, rgb_frame, landmarks, side):
+        """Returns (wrist, index_mcp) Landmarks for `side` ('left'/'right'), or None."""
+        t0 = time.perf_counter()
+        self.calls += 1
+        try:
+            elbow_i, wrist_i, _ = ANGLE_TRIPLETS["wristext"][0 if side == "left" else 1]
+            elbow, wrist = landmarks[elbow_i], landmarks[wrist_i]
+            if elbow.visibility < 0.5 or wrist.visibility < 0.5:
+                return None
+
+            h, w = rgb_frame.shape[:2]
+            ex_, ey = elbow.x * w, elbow.y * h
+            wx, wy = wrist.x * w, wrist.y * h
+            forearm = math.hypot(wx - ex_, wy - ey)
+            size = int(max(self.min_crop, self.crop_scale * forearm))
+            # Centre the crop a quarter of its size past the wrist, along the forearm, where the hand is
+            shift = (size / 4) / forearm if forearm > 0 else 0
+            cx, cy = wx + (wx - ex_) * shift, wy + (wy - ey) * shift
+            x0, y0 = int(max(0, cx - size / 2)), int(max(0, cy - size / 2))
+            x1, y1 = int(min(w, x0 + size)), int(min(h, y0 + size))
+            if x1 - x0 < 16 or y1 - y0 < 16:
+                return None
+
+            self.load()
+            result = self.hands.process(np.ascontiguousarray(rgb_frame[y0:y1, x0:x1]))
+            if not result.multi_hand_landmarks:
+                return None
+
+            hand = result.multi_hand_landmarks[0].landmark
+            cw, ch = x1 - x0, y1 - y0
+            points = []
+            for idx in (self.HAND_WRIST, self.HAND_INDEX_MCP):
+                points.append(Landmark((x0 + hand[idx].x * cw) / w, (y0 + hand[idx].y * ch) / h,
+                                       hand[idx].z, 1.0))
+            self.refined += 1
+            return tuple(points)
+        finally:
+            self.total_time += time.perf_counter() - t0
+
+    def close(self):
+        if self.hands is not None:
+            self.hands.close()
+            self.hands = None
+
+
+def bench_preprocessing(clips, max_frames=300,
+                        out_file=os.path.join("session_metrics", "preprocess_benchmark.csv")):
+    """Measures the allocations and time of each FramePreprocessor mode.
+
+    Every frame's process() call is wrapped in tracemalloc snapshots.
+    NumPy reports its array buffers to tracemalloc, and so do OpenCV
+    outputs, which are NumPy arrays. The previous frame's outputs are
+    kept alive across the call, so buffers created in it show up as new
+    traces instead of cancelling out against ones freed. Only blocks of
+    4 KB or more are counted, so small Python objects don't hide the
+    image buffers. Timing is taken in a separate pass without tracing.
+    """
+    configs = [("prealloc", True, True), ("legacy", False, True),
+               ("prealloc-noflip", True, False), ("legacy-noflip", False, False)]
+    large = 4096
+    rows = []
+    for clip in clips:
+        for name, preallocate, flip in configs:
+            source = CaptureSource(clip, latest_only=False)
+            if not source.is_opened():
+                print(f"Could not open {clip}")
+                break
+            frames = []
+            while len(frames) < max_frames:
+                ret, frame, _, _ = source.read()
+                if not ret:
+                    break
+                frames.append(frame.copy())
+            source.release()
+            if not frames:
+                continue
+
+            preprocessor = FramePreprocessor(flip=flip, preallocate=preallocate)
+            preprocessor.process(frames[0])  # first-frame buffer setup isn't steady state
+            allocs, alloc_bytes, out = [], [], None
+            tracemalloc.start()
+            try:
+                for frame in frames:
+                    before = tracemalloc.take_snapshot()
+                    prev, out = out, preprocessor.process(frame)
+                    after = tracemalloc.take_snapshot()
+                    new = [t.size for t in after.traces if t.size >= large]
+                    old = [t.size for t in before.traces if t.size >= large]
+                    allocs.append(len(new) - len(old))
+                    alloc_bytes.append(sum(new) - sum(old))
+                    prev = None
+            finally:
+                tracemalloc.stop()
+
+            timed = FramePreprocessor(flip=flip, preallocate=preallocate)
+            for frame in frames:
+                timed.process(frame)
+            row = {"clip": os.path.basename(str(clip)), "config": name, "frames": len(frames),
+                   "allocs_per_frame": float(np.mean(allocs)),
+                   "alloc_kb_per_frame": float(np.mean(alloc_bytes)) / 1024,
+                   "counted_allocs_per_frame": timed.allocs_per_frame(),
+                   "time_ms_per_frame": timed.avg_time_ms()}
+            rows.append(row)
+            print(f"{row['clip']:<24} {name:<16} allocs={row['allocs_per_frame']:5.2f}/frame "
+                  f"({row['alloc_kb_per_frame']:8.1f} KB) time={row['time_ms_per_frame']:6.3f} ms/frame")
+
+    if out_file and rows:
+        folder = os.path.dirname(out_file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(out_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nBenchmark written to {out_file}")
+    return rows
+
+
+def bench_pose_backends(clips, backends, out_file=None):
+    """Runs each backend over the same recorded clips and reports latency, throughput and CPU.
+
+    Frames are fed as fast as the source can be decoded. Asynchronous
+    backends may drop frames under that load, so throughput counts
+    results produced per second, not frames submitted. CPU is CPU time
+    of this process plus any worker process (the 'process' backend's
+    child) over wall time (100% = one core). loop_std_ms is the frame-loop
+    timing jitter. Wall time ends at the last frame or the last result,
+    whichever is later. A backend that cannot be created (e.g. 'tasks'
+    without its model file) is skipped.
+    """
+    rows = []
+    for backend_name in backends:
+        for clip in clips:
+            try:
+                backend = make_pose_backend(backend_name)
+            except Exception as e:
+                print(f"Skipping backend '{backend_name}': {e}")
+                break
+            source = CaptureSource(clip, latest_only=False)
+            if not source.is_opened():
+                print(f"Could not open {clip}")
+                backend.close()
+                continue
+            preprocessor = FramePreprocessor(flip=False)
+            submitted, loop_times = 0, []
+            wall_start, cpu_start = time.perf_counter(), time.process_time() + backend.worker_cpu
+            while True:
+                loop_start = time.perf_counter()
+                ret, frame, capture_ts, frame_id = source.read()
+                if not ret:
+                    break
+                _, rgb_frame = preprocessor.process(frame)
+                backend.process(rgb_frame, frame_id, capture_ts)
+                submitted += 1
+                loop_times.append(time.perf_counter() - loop_start)
+            loop_end = time.perf_counter()
+            # Let an asynchronous backend deliver in-flight results; the wait itself isn't timed
+            backend.drain()
+            wall = max(loop_end, backend.last_result_time) - wall_start
+            cpu = time.process_time() + backend.worker_cpu - cpu_start
+            source.release()
+            backend.close()
+
+            lat_ms = np.array(backend.latencies) * 1000 if backend.latencies else np.zeros(1)
+            loop_ms = np.array(loop_times) * 1000 if loop_times else np.zeros(1)
+            row = {
+                "backend": backend_name, "clip": os.path.basename(str(clip)),
+                "frames": submitted, "results": backend.results,
+                "latency_mean_ms": float(np.mean(lat_ms)),
+                "latency_p95_ms": float(np.percentile(lat_ms, 95)),
+                "throughput_fps": backend.results / wall if wall else 0.0,
+                "cpu_percent": 100.0 * cpu / wall if wall else 0.0,
+                "loop_mean_ms": float(np.mean(loop_ms)),
+                "loop_std_ms": float(np.std(loop_ms)),
+            }
+            rows.append(row)
+            print(f"{row['backend']:>10} {row['clip']:<24} frames={row['frames']:5d} "
+                  f"results={row['results']:5d} latency={row['latency_mean_ms']:6.1f} ms "
+                  f"(p95 {row['latency_p95_ms']:6.1f}) throughput={row['throughput_fps']:5.1f} fps "
+                  f"cpu={row['cpu_percent']:5.0f} % loop={row['loop_mean_ms']:5.1f}"
+                  f"+/-{row['loop_std_ms']:4.1f} ms")
+
+    if out_file and rows:
+        folder = os.path.dirname(out_file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(out_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nBenchmark written to {out_file}")
+    return rows
+
+
+# (left, right) landmark triplets whose middle point is the measured joint
+ANGLE_TRIPLETS = {
+    "squat": ((23, 25, 27), (24, 26, 28)),
+    "abduction": ((23, 11, 13), (24, 12, 14)),
+    "elbow": ((11, 13, 15), (12, 14, 16)),
+    "hipflex": ((11, 23, 25), (12, 24, 26)),
+    "wristext": ((13, 15, 19), (14, 16, 20)),
+}
+
+
+def landmarks_to_array(landmarks, out=None):
+    """Packs a landmark list into a (33, 4) array of x, y, z, visibility."""
+    if out is None:
+        out = np.zeros((len(landmarks), 4), dtype=np.float32)
+    for i, lm in enumerate(landmarks[:len(out)]):
+        vis = getattr(lm, 'visibility', None)
+        out[i] = (lm.x, lm.y, lm.z, 0.0 if vis is None else vis)
+    return out
+
+
+def batch_bilateral_angles(points, ex_type):
+    """Vectorised calc_angle for several people at once.
+
+    points: (P, 33, 4) array from landmarks_to_array.
+    Returns a (P, 2) array of [left, right] joint angles in degrees, with
+    the same 180-degree fallback as calc_angle for low-visibility or
+    degenerate points.
+    """
+    pts = points[:, np.asarray(ANGLE_TRIPLETS[ex_type]), :]  # (P, 2, 3, 4)
+    vba = pts[:, :, 0, :2] - pts[:, :, 1, :2]
+    vbc = pts[:, :, 2, :2] - pts[:, :, 1, :2]
+    denom = np.linalg.norm(vba, axis=-1) * np.linalg.norm(vbc, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = np.clip(np.sum(vba * vbc, axis=-1) / denom, -1.0, 1.0)
+    angles = np.degrees(np.arccos(cosine))
+    invalid = (pts[..., 3] < 0.5).any(axis=-1) | (denom == 0)
+    angles[invalid] = 180.0
+    return angles
+
+
+class PersonTracker:
+    """Keeps person IDs stable across frames in group sessions.
+
+    Each detected pose is matched to the nearest known torso centroid
+    (mean of shoulders and hips) with greedy nearest-first assignment.
+    Unmatched poses get a new ID. Tracks that go unseen for
+    `max_missing` frames are dropped and listed in `lost`.
+    """
+    TORSO = (11, 12, 23, 24)
+
+    def __init__(self, max_distance=0.15, max_missing=15):
+        self.max_distance = max_distance
+        self.max_missing = max_missing
+        self.tracks = {}  # person id -> [centroid, frames missing]
+        self.lost = []
+        self._next_id = 1
+
+    def update(self, points):
+        """Returns one person ID per row of `points` (P, 33, 4)."""
+        centroids = points[:, self.TORSO, :2].mean(axis=1)
+        ids = [None] * len(points)
+        track_ids = list(self.tracks)
+        if track_ids and len(points):
+            prev = np.array([self.tracks[t][0] for t in track_ids])
+            dist = np.linalg.norm(centroids[:, None, :] - prev[None, :, :], axis=-1)
+            taken = set()
+            for flat in np.argsort(dist, axis=None):
+                i, j = divmod(int(flat), len(track_ids))
+                if dist[i, j] > self.max_distance:
+                    break
+                if ids[i] is None and track_ids[j] not in taken:
+                    ids[i] = track_ids[j]
+                    taken.add(track_ids[j])
+
+        for i in range(len(points)):
+            if ids[i] is None:
+                ids[i] = self._next_id
+                self._next_id += 1
+
+        seen = set(ids)
+        for pid in track_ids:
+            if pid not in seen:
+                self.tracks[pid][1] += 1
+        self.lost = [pid for pid in track_ids
+                     if pid not in seen and self.tracks[pid][1] > self.max_missing]
+        for pid in self.lost:
+            del self.tracks[pid]
+        for i, pid in enumerate(ids):
+            self.tracks[pid] = [centroids[i], 0]
+        return ids
+
 
 class SmartPhysioDemoAssistant:
     def __init__(self, exercise, session_mode): # --- MODIFIED: Added session_mode ---
         self.exercise = exercise.lower()
         self.mppose = mp.solutions.pose
-        self.pose = self.mppose.Pose(static_image_mode=False, model_complexity=1,
-                                     enable_segmentation=False, min_detection_confidence=0.5,
-                                     min_tracking_confidence=0.5)
         self.mpdrawing = mp.solutions.drawing_utils
         self.current_ex = self.exercise
         self.FPS = 30
 
+        # --- NEW: Cross-thread tracing (PHYSIO_TRACE=1 to start recording, 't' toggles) ---
+        self.tracer = TraceRecorder(capacity=int(os.environ.get('PHYSIO_TRACE_CAPACITY', 200000)),
+                                    enabled=env_flag('PHYSIO_TRACE', False))
+        self._frame_ctx = (0, time.perf_counter())  # (frame_id, capture_ts) of the frame being analysed
+
         # --- MODIFICATION START: Replaced pyttsx3 with gTTS/playsound system ---
         self.audio_queue = queue.Queue()
         self.audio_cache = {}  # Cache generated audio files
@@ -125,7 +1633,7 @@ class SmartPhysioDemoAssistant:
         # --- NEW: Non-blocking vibration client (talks to ESP32 web endpoint) ---
         vib_host = os.environ.get('VIBRATION_HOST', 'http://esp32-haptic.local')
         try:
-            self.vib_client = VibrationClient(vib_host)
+            self.vib_client = VibrationClient(vib_host, tracer=self.tracer)
             print(f"Vibration client initialized -> {vib_host}")
         except Exception as e:
             print(f"Warning: could not initialize VibrationClient: {e}")
@@ -143,6 +1651,59 @@ class SmartPhysioDemoAssistant:
         self.total_frames_captured = 0    # Counter for all frames read from camera
         self.total_frames_processed = 0   # Counter for frames where pose was detected
 
+        # --- NEW: Reusable preprocessing buffers ---
+        # PHYSIO_FLIP=0 skips the image flip and swaps the LEFT/RIGHT side labels instead;
+        # PHYSIO_PREALLOC=0 restores the per-frame allocating path for comparison.
+        self.preprocessor = FramePreprocessor(flip=env_flag('PHYSIO_FLIP', True),
+                                              preallocate=env_flag('PHYSIO_PREALLOC', True))
+        self.swap_sides = not self.preprocessor.flip
+
+        # --- NEW: Group sessions: PHYSIO_MAX_PEOPLE > 1 tracks several patients in one camera ---
+        self.max_people = max(1, int(os.environ.get('PHYSIO_MAX_PEOPLE', 1)))
+        self.person_tracker = PersonTracker()
+        self.people = {}  # person id -> {"id", "exercises", "vib_host", "vib_client"}
+        self.group_vib_hosts = [h.strip() for h in os.environ.get('PHYSIO_GROUP_VIB_HOSTS', '').split(',') if h.strip()]
+        self._vib_clients = {}  # host -> VibrationClient, handed to whoever holds that host
+        self._group_points = np.zeros((self.max_people, 33, 4), dtype=np.float32)
+        self._last_group = None
+
+        # --- NEW: Pose estimator behind the PoseBackend interface (PHYSIO_POSE_BACKEND) ---
+        self.pose_backend = make_pose_backend(num_poses=self.max_people)
+        print(f"Pose backend: {self.pose_backend.name}"
+              + (f" (group session, up to {self.max_people} people)" if self.max_people > 1 else ""))
+        self.capture_ages = []  # capture -> processing start, ms per frame
+
+        # --- NEW: Idle power saving: no pose model after PHYSIO_IDLE_AFTER s without a pose (0 = off) ---
+        self.idle_after = float(os.environ.get('PHYSIO_IDLE_AFTER', 10))
+        self.motion_gate = MotionGate()
+        self.idle = False
+        self.idle_time = 0.0         # wall seconds spent idle
+        self.idle_frames = 0
+        self.idle_cpu = 0.0          # CPU seconds (incl. pose worker) spent on idle frames
+        self.active_frames = 0
+        self.active_cpu = 0.0        # CPU seconds (incl. pose worker) spent on frames with inference
+
+        self._init_thresholds()
+
+        # --- NEW: Hand-model refinement of the wrist angle while wristext is active (PHYSIO_WRIST_REFINE=1) ---
+        self.wrist_refiner = WristRefiner() if env_flag('PHYSIO_WRIST_REFINE', False) else None
+        self.refined_wrist_points = None
+
+        self.exercises = {
+            "squat": self._get_state(),
+            "abduction": self._get_state(),
+            "elbow": self._get_state(),
+            "hipflex": self._get_state(),
+            "wristext": self._get_state()
+        }
+
+        if self.session_mode == "assisted":
+            self.last_status_message = "SESSION PAUSED"
+        else:
+             self.last_status_message = "" # Solo mode starts with countdown
+
+    def _init_thresholds(self):
+        """ Sets the form/rep angle thresholds (also swept by the `sweep` tool) """
         # --- MODIFIED: Updated Perfect Thresholds (Single Value) ---
         self.squat_perfect_angle = 90    # Perfect if angle <= 90
         self.abd_perfect_angle = 150   # Perfect if angle >= 150
@@ -163,19 +1724,6 @@ class SmartPhysioDemoAssistant:
         self.wext_straight_angle = 165 # Rest angle for Wrist Extension
         self.wext_bent_angle = 135   # "Correct" Wrist is <= 135
 
-        self.exercises = {
-            "squat": self._get_state(),
-            "abduction": self._get_state(),
-            "elbow": self._get_state(),
-            "hipflex": self._get_state(),
-            "wristext": self._get_state()
-        }
-
-        if self.session_mode == "assisted":
-            self.last_status_message = "SESSION PAUSED"
-        else:
-             self.last_status_message = "" # Solo mode starts with countdown
-
     def _get_state(self):
         """ Returns a clean state dictionary for an exercise """
         return {
@@ -199,6 +1747,76 @@ class SmartPhysioDemoAssistant:
             "played_session_start": False,
         }
 
+    def _get_person(self, pid):
+        """Returns (creating on first sight) the per-person state for a group session."""
+        person = self.people.get(pid)
+        if person is None:
+            person = {"id": pid, "exercises": {ex: self._get_state() for ex in self.exercises},
+                      "vib_host": None, "vib_client": None}
+            self.people[pid] = person
+        if person["vib_host"] is None and self.group_vib_hosts:
+            in_use = {p["vib_host"] for p in self.people.values()}
+            free = [h for h in self.group_vib_hosts if h not in in_use]
+            if free:
+                host = free[0]
+                if host not in self._vib_clients:
+                    self._vib_clients[host] = VibrationClient(host, tracer=self.tracer)
+                person["vib_host"], person["vib_client"] = host, self._vib_clients[host]
+                print(f"Person {pid} -> haptics {host}")
+        return person
+
+    def _release_person(self, pid):
+        """Frees the haptic device of someone who left the frame; their scores are kept."""
+        person = self.people.get(pid)
+        if person:
+            person["vib_host"], person["vib_client"] = None, None
+
+    def _track_people(self, points):
+        """Matches this frame's poses to person IDs and frees the haptics of anyone who left."""
+        ids = self.person_tracker.update(points)
+        for pid in self.person_tracker.lost:
+            self._release_person(pid)
+        return ids
+
+    def _process_group_frame(self, frame, poses, new_result, frame_id):
+        """Analyses and draws every detected person; returns (frame, data of the first person)."""
+        ex = self.current_ex
+        if new_result or self._last_group is None:
+            n = min(len(poses), self.max_people)
+            points = self._group_points[:n]
+            for i in range(n):
+                landmarks_to_array(poses[i], out=points[i])
+            ids = self._track_people(points)
+
+            group = []
+            if self.session_active:
+                # One vectorised angle pass for everyone, then the per-person state machines
+                with self.tracer.span("analyze_form", frame_id=frame_id, people=n):
+                    angles = batch_bilateral_angles(points, ex)
+                    for i, pid in enumerate(ids):
+                        data = self.analyze_form(poses[i], ex, angles={'left': angles[i, 0], 'right': angles[i, 1]},
+                                                 person=self._get_person(pid))
+                        group.append((pid, poses[i], data))
+            else:
+                for i, pid in enumerate(ids):
+                    self._get_person(pid)
+                    group.append((pid, poses[i], self._get_default_data()))
+            self._last_group = sorted(group, key=lambda g: g[0])
+
+        h, w = frame.shape[:2]
+        with self.tracer.span("draw", frame_id=frame_id):
+            for pid, landmarks, data in self._last_group:
+                frame = self.draw_landmarks(frame, landmarks, data['form_status'], ex)
+                nose = landmarks[0]
+                cv2.putText(frame, f"P{pid}  reps {data['repcount']}  {data['form_status']}",
+                            (int(nose.x * w) - 60, max(190, int(nose.y * h) - 40)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+            primary = self._last_group[0][2] if self._last_group else self._get_default_data()
+            frame = self.draw_feedback(frame, primary)
+
+        people = [dict(data, person_id=pid) for pid, _, data in self._last_group]
+        return frame, dict(primary, people=people)
+
     def _get_default_data(self):
         """ Returns a blank data dictionary for a paused state """
         state = self.exercises[self.current_ex]
@@ -238,11 +1856,13 @@ class SmartPhysioDemoAssistant:
         while True:
             try:
                 # --- MODIFICATION: Reduced sleep/wait time for faster response ---
-                message = self.audio_queue.get(timeout=0.01) # <-- CHANGED from 0.1
-                if message is None:
+                item = self.audio_queue.get(timeout=0.01) # <-- CHANGED from 0.1
+                if item is None:
                     break
+                message, trace_ctx = item
                 
                 print(f"🔊 SPEAKING: {message}")
+                play_start = time.perf_counter()
                 
                 if message in self.audio_cache:
                     audio_file = self.audio_cache[message]
@@ -252,7 +1872,16 @@ class SmartPhysioDemoAssistant:
                     tts.save(audio_file)
                     self.audio_cache[message] = audio_file
                 
-                playsound(audio_file)
+                if trace_ctx:
+                    frame_id, capture_ts, enqueue_ts, flow_id = trace_ctx
+                    self.tracer.flow("feedback", flow_id, play_start, start=False)
+                    self.tracer.complete("audio.queue_wait", enqueue_ts, play_start,
+                                         cat="audio", frame_id=frame_id)
+                    self.tracer.async_span("capture_to_audio", capture_ts, play_start, flow_id,
+                                           frame_id=frame_id, message=message)
+
+                with self.tracer.span("audio.play", cat="audio", message=message):
+                    playsound(audio_file)
                 
             except queue.Empty:
                 continue
@@ -270,9 +1899,19 @@ class SmartPhysioDemoAssistant:
                     break
             
             print(f"AUDIO CUE: {message}")
-            self.audio_queue.put(message)
+            self.audio_queue.put((message, self._feedback_trace_ctx()))
         except Exception as e:
             print(f"Error queuing audio: {e}")
+
+    def _feedback_trace_ctx(self):
+        """Trace context handed to the audio/haptic workers with a cue (None when tracing is off)."""
+        if not self.tracer.enabled:
+            return None
+        frame_id, capture_ts = self._frame_ctx
+        now = time.perf_counter()
+        flow_id = self.tracer.next_id()
+        self.tracer.flow("feedback", flow_id, now, start=True)
+        return (frame_id, capture_ts, now, flow_id)
     # --- MODIFICATION END ---
 
 
@@ -298,24 +1937,30 @@ class SmartPhysioDemoAssistant:
         angles = {}
         lmk = lambda i: lm[i] if i < len(lm) else None
 
-        if ex_type == "squat":
-            angles['right'] = self.calc_angle(lmk(24), lmk(26), lmk(28))
-            angles['left'] = self.calc_angle(lmk(23), lmk(25), lmk(27))
-        elif ex_type == "abduction":
-            angles['right'] = self.calc_angle(lmk(24), lmk(12), lmk(14))
-            angles['left'] = self.calc_angle(lmk(23), lmk(11), lmk(13))
-        elif ex_type == "elbow":
-            angles['right'] = self.calc_angle(lmk(12), lmk(14), lmk(16))
-            angles['left'] = self.calc_angle(lmk(11), lmk(13), lmk(15))
-        elif ex_type == "hipflex":
-            angles['right'] = self.calc_angle(lmk(12), lmk(24), lmk(26))
-            angles['left'] = self.calc_angle(lmk(11), lmk(23), lmk(25))
-        elif ex_type == "wristext":
-            angles['right'] = self.calc_angle(lmk(14), lmk(16), lmk(20))
-            angles['left'] = self.calc_angle(lmk(13), lmk(15), lmk(19))
+        if ex_type in ANGLE_TRIPLETS:
+            left, right = ANGLE_TRIPLETS[ex_type]
+            angles['right'] = self.calc_angle(*(lmk(i) for i in right))
+            angles['left'] = self.calc_angle(*(lmk(i) for i in left))
 
         return angles
 
+    def refine_wrist_angles(self, rgb_frame, lm, angles):
+        """Replaces the tracked side's wristext angle with one measured on the hand model's landmarks.
+
+        The other side is set to 180 so that analyze_form keeps tracking
+        the refined side even when refinement makes its angle larger.
+        """
+        self.refined_wrist_points = None
+        side = "left" if angles.get('left', 180) < angles.get('right', 180) else "right"
+        points = self.wrist_refiner.refine(rgb_frame, lm, side)
+        if points is None:
+            return angles
+        elbow = lm[ANGLE_TRIPLETS["wristext"][0 if side == "left" else 1][0]]
+        refined = {'left': 180, 'right': 180}
+        refined[side] = self.calc_angle(elbow, *points)
+        self.refined_wrist_points = points
+        return refined
+
     def log_failed_rep(self, state, ex_type, threshold_min):
         best_angle = state["current_rep_best_angle"]
 
@@ -364,13 +2009,21 @@ class SmartPhysioDemoAssistant:
         elif ex == "wristext": return angle <= self.wext_perfect_angle
         return False
 
-    def analyze_form(self, lm, ex):
+    def analyze_form(self, lm, ex, angles=None, person=None):
+        """Runs the rep/form state machine for one frame.
 
-        state = self.exercises[ex]
+        angles: precomputed {'left', 'right'} angles (e.g. from
+        batch_bilateral_angles); computed from `lm` when omitted.
+        person: group-session entry from `_get_person`; its own exercise
+        state and haptic client are used instead of the single-patient ones.
+        """
+        exercises = person["exercises"] if person else self.exercises
+        state = exercises[ex]
         state["frame_counter"] += 1
         current_frame = state["frame_counter"]
 
-        angles = self.get_bilateral_angles(lm, ex)
+        if angles is None:
+            angles = self.get_bilateral_angles(lm, ex)
         angle_L, angle_R = angles.get('left', 180), angles.get('right', 180)
 
         angle, tracked_side = (0, "NONE")
@@ -378,6 +2031,9 @@ class SmartPhysioDemoAssistant:
             angle, tracked_side = min(angle_L, angle_R), "LEFT" if angle_L < angle_R else "RIGHT"
         elif ex == "abduction":
             angle, tracked_side = max(angle_L, angle_R), "LEFT" if angle_L > angle_R else "RIGHT"
+        if self.swap_sides and tracked_side != "NONE":
+            # Unflipped image: the model's LEFT is the flipped pipeline's RIGHT
+            tracked_side = "RIGHT" if tracked_side == "LEFT" else "LEFT"
         state["tracked_side"] = tracked_side
 
         default_best_angle = 180
@@ -477,11 +2133,12 @@ class SmartPhysioDemoAssistant:
 
             if self.session_mode == "solo" and state["rest_persistence_counter"] >= (15 * self.FPS):
                 if not state["session_ended_for_ex"]:
-                    self.session_active = False
                     state["session_ended_for_ex"] = True
-                    self.last_status_message = "SESSION ENDED"
-                    self.play_audio("Session ended")
                     state["rest_persistence_counter"] = 0
+                    if person is None: # one resting group member doesn't end the class
+                        self.session_active = False
+                        self.last_status_message = "SESSION ENDED"
+                        self.play_audio("Session ended")
 
             elif state["rest_persistence_counter"] >= (5 * self.FPS):
                 is_stopped = True 
@@ -505,11 +2162,14 @@ class SmartPhysioDemoAssistant:
                 # trigger a short haptic pulse on the tracked side (non-blocking)
                 try:
                     side = tracked_side if tracked_side in ("LEFT", "RIGHT") else "BOTH"
+                    vib_client = person["vib_client"] if person else getattr(self, 'vib_client', None)
                     # short buzz to alert user; asynchronous via VibrationClient
-                    if hasattr(self, 'vib_client') and self.vib_client:
-                        self.vib_client.vibrate(side=side, duration_ms=250, intensity=255)
+                    if vib_client:
+                        vib_client.vibrate(side=side, duration_ms=250, intensity=255,
+                                           trace_ctx=self._feedback_trace_ctx())
                     else:
-                        print(f"HAPTIC (no client): Vibrate {side} - Incorrect form!")
+                        who = f" (person {person['id']})" if person else ""
+                        print(f"HAPTIC (no client): Vibrate {side}{who} - Incorrect form!")
                 except Exception as _e:
                     print(f"HAPTIC trigger failed: {_e}")
 
@@ -552,7 +2212,7 @@ class SmartPhysioDemoAssistant:
                 "last_score": state["rep_scores"][-1] if state["rep_scores"] else 0,
                 "avg_score": avg_score, "feedback": ""}
 
-    def draw_landmarks(self, frame, pose_landmarks, form_status, ex):
+    def draw_landmarks(self, frame, landmarks_list, form_status, ex):
         involved = {"squat": [23, 25, 27, 24, 26, 28],
                     "abduction": [11, 13, 23, 12, 14, 24],
                     "elbow": [11, 13, 15, 12, 14, 16],
@@ -565,10 +2225,9 @@ class SmartPhysioDemoAssistant:
         color = color_map.get(form_status, NEUTRAL_COLOR)
         h, w, _ = frame.shape
 
-        if not pose_landmarks or not pose_landmarks.landmark:
+        if not landmarks_list:
              return frame
 
-        landmarks_list = pose_landmarks.landmark
         num_landmarks = len(landmarks_list)
 
         for idx, lm in enumerate(landmarks_list):
@@ -668,23 +2327,52 @@ class SmartPhysioDemoAssistant:
         return frame
 
 
+    def _export_trace(self):
+        if not self.tracer.events:
+            return
+        path = os.path.join("session_metrics", f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            self.tracer.export(path)
+        except (IOError, OSError) as e:
+            print(f"Error writing trace file {path}: {e}")
+        self.tracer.events.clear()
+
     def run(self):
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        # --- MODIFIED: Capture goes through CaptureSource (camera, file or image sequence) ---
+        cap = CaptureSource.from_env()
+        if not cap.is_opened():
              print("Error: Could not open video capture device.")
              return
 
-        cap.set(3, 1280)
-        cap.set(4, 720)
-        cap.set(5, self.FPS)
-
         window_name = "SmartPhysio"
         cv2.namedWindow(window_name)
 
-        while cap.isOpened():
+        # --- NEW: Optional live dashboard for the therapist (PHYSIO_DASHBOARD_PORT=8080) ---
+        dashboard = None
+        dashboard_port = os.environ.get('PHYSIO_DASHBOARD_PORT')
+        if dashboard_port:
+            try:
+                dashboard = DashboardServer(host=os.environ.get('PHYSIO_DASHBOARD_HOST', '127.0.0.1'),
+                                            port=int(dashboard_port),
+                                            jpeg_quality=int(os.environ.get('PHYSIO_DASHBOARD_QUALITY', 70)),
+                                            token=os.environ.get('PHYSIO_DASHBOARD_TOKEN'))
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not start dashboard server: {e}")
+
+        last_result_id, last_data = 0, None
+        last_pose_time, resume_frame_id = time.time(), 0
+
+        # --- NEW: Optional session recording for later review (PHYSIO_RECORD=1) ---
+        recorder = SessionRecorder.from_env(self.FPS) if env_flag('PHYSIO_RECORD', False) else None
+
+        while cap.is_opened():
             frame_start_time = time.time()
+            loop_start = time.perf_counter()
+            # Includes a pose worker process, so idle savings compare like with like
+            cpu_start = time.process_time() + self.pose_backend.worker_cpu
 
-            ret, frame = cap.read()
+            with self.tracer.span("capture.read"):
+                ret, frame, capture_ts, frame_id = cap.read()
             
             self.total_frames_captured += 1
             
@@ -692,14 +2380,61 @@ class SmartPhysioDemoAssistant:
                 print("Error: Failed to capture frame.")
                 break
 
-            frame = cv2.flip(frame, 1)
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            result = self.pose.process(rgb_frame)
+            capture_age_ms = (time.perf_counter() - capture_ts) * 1000
+            self.capture_ages.append(capture_age_ms)
+            self._frame_ctx = (frame_id, capture_ts)
+
+            if not self.idle and self.idle_after > 0 and frame_start_time - last_pose_time > self.idle_after:
+                self.idle = True
+                self.motion_gate.reset()
+                print(f"No pose for {self.idle_after:g}s - entering idle mode")
+            if self.idle:
+                with self.tracer.span("motion_gate", frame_id=frame_id):
+                    motion = self.motion_gate.update(frame)
+                if motion:
+                    # Someone stepped in: run the model again from this frame on
+                    self.idle = False
+                    last_pose_time, resume_frame_id = frame_start_time, frame_id
+                    print(f"Motion detected ({self.motion_gate.last_changed:.0%} changed) - resuming")
+            frame_was_idle = self.idle
+
+            with self.tracer.span("preprocess", frame_id=frame_id):
+                frame, rgb_frame = self.preprocessor.process(frame, need_rgb=not self.idle)
+
+            record_frame = recorder is not None and recorder.accepts_frame()
+            raw_copy = recorder.copy_frame(frame) if record_frame and recorder.record_raw else None
+
+            result = None
+            refine_wrist = self.wrist_refiner is not None and self.current_ex == "wristext"
+            if refine_wrist and self.pose_backend.asynchronous and not self.idle:
+                # The pose may come back frames later; crop the hand from the frame it was estimated on
+                self.wrist_refiner.keep_frame(frame_id, rgb_frame)
+            if not self.idle:
+                with self.tracer.span("pose.process", frame_id=frame_id):
+                    result = self.pose_backend.process(rgb_frame, frame_id, capture_ts)
+                # An async backend may still hold a result from before the idle period
+                if result is not None and result.frame_id < resume_frame_id:
+                    result = None
+            landmarks = result.landmarks if result else None
+            if landmarks:
+                last_pose_time = frame_start_time
+            # Async backends can hand back the same result on several frames; analyse it once
+            new_result = result is not None and result.frame_id != last_result_id
+            if new_result:
+                last_result_id = result.frame_id
+            if result is not None:
+                # Cues raised by the analysis belong to the frame the pose came from, not this one
+                self._frame_ctx = (result.frame_id, result.capture_ts)
 
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q"): break
 
+            if key == ord("t"): # Toggle trace recording; export when switched off
+                self.tracer.enabled = not self.tracer.enabled
+                print(f"Trace recording {'ON' if self.tracer.enabled else 'OFF'}")
+                if not self.tracer.enabled:
+                    self._export_trace()
+
             if self.session_mode == "assisted" and (time.time() - self.last_key_press_time > 0.5):
                 if key == ord('1'): # Start/Resume
                     self.session_active = True
@@ -723,6 +2458,9 @@ class SmartPhysioDemoAssistant:
                 print(f"\nSwitching to {new_ex}...")
                 self.current_ex = new_ex
                 self.exercises[self.current_ex] = self._get_state() # Resets all flags
+                for person in self.people.values():
+                    person["exercises"][self.current_ex] = self._get_state()
+                last_data, self._last_group = None, None
                 self.start_time = time.time()
                 self.session_active = False
                 if self.session_mode == "assisted":
@@ -768,53 +2506,136 @@ class SmartPhysioDemoAssistant:
                          self.last_status_message = "SESSION PAUSED"
                          session_status_message = "SESSION PAUSED"
 
-            if result.pose_landmarks and result.pose_landmarks.landmark:
+            if landmarks:
                 
                 self.total_frames_processed += 1
 
-                if self.session_active:
-                    data = self.analyze_form(result.pose_landmarks.landmark, self.current_ex)
-                    frame = self.draw_landmarks(frame, result.pose_landmarks, data['form_status'], self.current_ex)
-                    frame = self.draw_feedback(frame, data)
+                if self.max_people > 1:
+                    frame, data = self._process_group_frame(frame, result.poses, new_result, frame_id)
+
+                elif self.session_active:
+                    if new_result or last_data is None:
+                        angles = None
+                        if refine_wrist:
+                            pose_rgb = rgb_frame if result.frame_id == frame_id \
+                                else self.wrist_refiner.frame_for(result.frame_id)
+                            self.refined_wrist_points = None
+                            if pose_rgb is not None:
+                                with self.tracer.span("wrist_refine", frame_id=result.frame_id):
+                                    angles = self.refine_wrist_angles(
+                                        pose_rgb, landmarks, self.get_bilateral_angles(landmarks, "wristext"))
+                        with self.tracer.span("analyze_form", frame_id=frame_id):
+                            data = self.analyze_form(landmarks, self.current_ex, angles=angles)
+                        last_data = data
+                    else:
+                        data = last_data
+                    with self.tracer.span("draw", frame_id=frame_id):
+                        frame = self.draw_landmarks(frame, landmarks, data['form_status'], self.current_ex)
+                        if self.refined_wrist_points and self.current_ex == "wristext":
+                            h, w = frame.shape[:2]
+                            for pt in self.refined_wrist_points:
+                                cv2.circle(frame, (int(pt.x * w), int(pt.y * h)), 4, (0, 255, 255), -1)
+                        frame = self.draw_feedback(frame, data)
 
                     if not self.session_active and self.session_mode == "solo":
                         session_status_message = self.last_status_message
 
                 else: 
                     data = self._get_default_data()
-                    frame = self.draw_landmarks(frame, result.pose_landmarks, "NONE", self.current_ex)
+                    frame = self.draw_landmarks(frame, landmarks, "NONE", self.current_ex)
                     frame = self.draw_feedback(frame, data)
 
             else: 
+                if self.max_people > 1:
+                    # Nobody in view (or idle): age the tracks so people who left are dropped
+                    self._track_people(self._group_points[:0])
                 data = self._get_default_data()
                 frame = self.draw_feedback(frame, data)
-                cv2.putText(frame, "No pose detected - body must be visible.", (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                no_pose_text = ("Idle - step in front of the camera to start." if frame_was_idle
+                                else "No pose detected - body must be visible.")
+                cv2.putText(frame, no_pose_text, (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
             if session_status_message:
                 frame = self.draw_session_status(frame, session_status_message)
 
-            cv2.imshow(window_name, frame)
+            cv2.putText(frame, f"Capture age: {capture_age_ms:.0f} ms", (20, frame.shape[0] - 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+            if record_frame:
+                with self.tracer.span("recorder.submit", frame_id=frame_id):
+                    recorder.submit(frame, raw_copy, capture_ts, frame_id,
+                                    dict(data, exercise=self.current_ex, session_active=self.session_active),
+                                    result.poses if landmarks else None,
+                                    result.frame_id if landmarks else None)
+
+            if dashboard:
+                with self.tracer.span("dashboard.publish", frame_id=frame_id):
+                    dashboard.publish(frame, dict(data, frame_id=frame_id, exercise=self.current_ex,
+                                                  session_mode=self.session_mode,
+                                                  session_active=self.session_active,
+                                                  status=session_status_message,
+                                                  pose_detected=bool(landmarks),
+                                                  capture_age_ms=capture_age_ms), frame_id)
+
+            with self.tracer.span("imshow", frame_id=frame_id):
+                cv2.imshow(window_name, frame)
 
             frame_end_time = time.time()
             latency = frame_end_time - frame_start_time
-            self.frame_latencies.append(latency)
+
+            frame_cpu = time.process_time() + self.pose_backend.worker_cpu - cpu_start
+            if frame_was_idle:
+                # Idle frames give no feedback, so they stay out of the latency metric
+                self.idle_frames += 1
+                self.idle_cpu += frame_cpu
+                self.idle_time += latency
+            else:
+                self.frame_latencies.append(latency)
+                self.active_frames += 1
+                self.active_cpu += frame_cpu
+
+            if self.tracer.enabled:
+                loop_end = time.perf_counter()
+                self.tracer.complete("frame", loop_start, loop_end, frame_id=frame_id,
+                                     capture_age_ms=round(capture_age_ms, 2))
+                self.tracer.async_span("capture_to_display", capture_ts, loop_end,
+                                       self.tracer.next_id(), frame_id=frame_id)
 
 
         cap.release()
+        self.pose_backend.close()
+        if self.wrist_refiner:
+            self.wrist_refiner.close()
         cv2.destroyAllWindows()
+        if recorder:
+            recorder.stop()
+            print(f"Recording: {recorder.frames_written} frames in {len(recorder.segments)} segment(s), "
+                  f"{recorder.frames_dropped} dropped (encoder behind), {recorder.frames_padded} padded")
+        if dashboard:
+            dashboard.stop()
+            print(f"Dashboard: {dashboard.frames_encoded} frames streamed, "
+                  f"{dashboard.frames_dropped} dropped while encoders were busy")
         self.audio_queue.put(None)
         self.audio_thread.join()
-        # Stop vibration worker cleanly
+        # Stop vibration workers cleanly
         try:
             if hasattr(self, 'vib_client') and self.vib_client:
                 self.vib_client.stop()
+            for client in self._vib_clients.values():
+                client.stop()
         except Exception as e:
             print(f"Error stopping vibration client: {e}")
 
+        if self.tracer.enabled:
+            self._export_trace()
+
         if not self.frame_latencies:
             avg_latency = 0
+            latency_std_ms = latency_p95_ms = 0
         else:
             avg_latency = np.mean(self.frame_latencies)
+            latency_std_ms = np.std(self.frame_latencies) * 1000
+            latency_p95_ms = np.percentile(self.frame_latencies, 95) * 1000
         
         if self.total_frames_captured == 0:
             frame_processing_efficiency = 0.0
@@ -832,11 +2653,28 @@ class SmartPhysioDemoAssistant:
         except OSError as e:
             print(f"Error creating directory {folder_name}: {e}")
 
+        avg_capture_age = np.mean(self.capture_ages) if self.capture_ages else 0
+        max_capture_age = np.max(self.capture_ages) if self.capture_ages else 0
+
+        # CPU saved: idle frames priced at the measured cost of an active frame
+        idle_cpu_saved = 0.0
+        if self.idle_frames and self.active_frames:
+            idle_cpu_saved = self.idle_frames * (self.active_cpu / self.active_frames
+                                                 - self.idle_cpu / self.idle_frames)
+
+        avg_preprocess_ms = self.preprocessor.avg_time_ms()
+        preprocess_allocs = self.preprocessor.allocs_per_frame()
+
         headers = [
             "Timestamp", "SessionMode", "Exercise", "TotalReps", "AverageScore",
-            "RepScores", "AvgLatency_sec", "FrameProcessingEfficiency_Percent"
+            "RepScores", "AvgLatency_sec", "FrameProcessingEfficiency_Percent",
+            "AvgPreprocess_ms", "PreprocessAllocsPerFrame", "AvgCaptureAge_ms",
+            "CameraFramesSkipped", "PersonId", "IdleTime_sec", "IdleCpuSaved_sec",
+            "PoseBackend", "LatencyStd_ms"
         ]
         
+        # Older logs have fewer columns; keep appending only to a file with this header
+        file_name = matching_log_path(file_name, headers)
         file_exists = os.path.isfile(file_name)
         
         try:
@@ -847,33 +2685,47 @@ class SmartPhysioDemoAssistant:
                     writer.writerow(headers)
                     file_exists = True
             
-                for ex in ["squat", "abduction", "elbow", "hipflex", "wristext"]:
-                    st = self.exercises[ex]
+                # Single-patient state first, then one set of rows per group member
+                summaries = [("", self.exercises)] + [(pid, person["exercises"])
+                                                      for pid, person in sorted(self.people.items())]
+                for person_id, exercises in summaries:
+                    for ex in ["squat", "abduction", "elbow", "hipflex", "wristext"]:
+                        st = exercises[ex]
                     
-                    if st['repcount'] > 0 or st['rep_scores']:
-                        print(f"\n--- {ex.title()} SESSION SUMMARY ---")
-                        print(f"Total reps: {st['repcount']}")
+                        if st['repcount'] > 0 or st['rep_scores']:
+                            who = f" (Person {person_id})" if person_id != "" else ""
+                            print(f"\n--- {ex.title()} SESSION SUMMARY{who} ---")
+                            print(f"Total reps: {st['repcount']}")
                         
-                        formatted_scores = [f"{score:.0f}" for score in st['rep_scores']]
-                        scores_str = f"[{', '.join(formatted_scores)}]"
-                        print(f"Rep Scores: {scores_str}")
+                            formatted_scores = [f"{score:.0f}" for score in st['rep_scores']]
+                            scores_str = f"[{', '.join(formatted_scores)}]"
+                            print(f"Rep Scores: {scores_str}")
                         
-                        avg_score = np.mean(st['rep_scores']) if st['rep_scores'] else 0
-                        print(f"Average Score: {avg_score:.1f}")
-                        print("------------------------\n")
-
-                        session_data_row = [
-                            session_timestamp,
-                            self.session_mode,
-                            ex,
-                            st['repcount'],
-                            f"{avg_score:.2f}",
-                            scores_str,
-                            f"{avg_latency:.2f}",
-                            f"{frame_processing_efficiency:.2f}"
-                        ]
+                            avg_score = np.mean(st['rep_scores']) if st['rep_scores'] else 0
+                            print(f"Average Score: {avg_score:.1f}")
+                            print("------------------------\n")
+
+                            session_data_row = [
+                                session_timestamp,
+                                self.session_mode,
+                                ex,
+                                st['repcount'],
+                                f"{avg_score:.2f}",
+                                scores_str,
+                                f"{avg_latency:.2f}",
+                                f"{frame_processing_efficiency:.2f}",
+                                f"{avg_preprocess_ms:.2f}",
+                                f"{preprocess_allocs:.3f}",
+                                f"{avg_capture_age:.1f}",
+                                cap.frames_skipped,
+                                person_id,
+                                f"{self.idle_time:.1f}",
+                                f"{idle_cpu_saved:.1f}",
+                                self.pose_backend.name,
+                                f"{latency_std_ms:.2f}"
+                            ]
                         
-                        writer.writerow(session_data_row)
+                            writer.writerow(session_data_row)
             
             print(f"\nSuccessfully appended metrics to {file_name}")
             
@@ -882,10 +2734,473 @@ class SmartPhysioDemoAssistant:
 
         print("\n--- SYSTEM PERFORMANCE METRICS ---")
         print(f"Feedback Latency (avg): {avg_latency:.2f} sec")
+        print(f"Loop Timing Jitter: std {latency_std_ms:.2f} ms, p95 {latency_p95_ms:.1f} ms "
+              f"(pose backend: {self.pose_backend.name})")
         print(f"Frame Processing Efficiency: {frame_processing_efficiency:.2f} %")
+        print(f"Preprocessing (avg): {avg_preprocess_ms:.2f} ms/frame, "
+              f"{preprocess_allocs:.3f} buffer allocations/frame (counted, not measured) "
+              f"(flip={'on' if self.preprocessor.flip else 'off'}, "
+              f"prealloc={'on' if self.preprocessor.preallocate else 'off'})")
+        print(f"Capture Age (avg/max): {avg_capture_age:.1f} / {max_capture_age:.1f} ms, "
+              f"{cap.frames_skipped} stale camera frames skipped")
+        if self.wrist_refiner and self.wrist_refiner.calls:
+            print(f"Wrist Refinement: {self.wrist_refiner.refined}/{self.wrist_refiner.calls} frames refined, "
+                  f"{self.wrist_refiner.total_time / self.wrist_refiner.calls * 1000:.2f} ms/frame")
+        print(f"Idle Mode: {self.idle_time:.1f} sec idle ({self.idle_frames} frames), "
+              f"~{idle_cpu_saved:.1f} CPU-sec saved")
         
 
+class _NullVibration:
+    def vibrate(self, *args, **kwargs):
+        pass
+
+
+class ReplayAssistant(SmartPhysioDemoAssistant):
+    """The exercise state machine without camera, model, audio or haptics.
+
+    Replays a recorded (N, 2) series of [left, right] joint angles
+    through the real analyze_form, optionally with overridden thresholds,
+    and reports the rep count.
+    """
+    def __init__(self, exercise, thresholds=None, fps=30, session_mode="assisted"):
+        self.exercise = self.current_ex = exercise
+        self.FPS = fps
+        self.session_mode = session_mode
+        self.session_active = True
+        self.last_status_message = ""
+        self.swap_sides = False
+        self.tracer = TraceRecorder(capacity=1)
+        self.vib_client = _NullVibration()
+        self.wrist_refiner = None
+        self._init_thresholds()
+        for name, value in (thresholds or {}).items():
+            setattr(self, name, value)
+        self.exercises = {ex: self._get_state() for ex in ANGLE_TRIPLETS}
+
+    def play_audio(self, message):
+        pass
+
+    def count_reps(self, angles):
+        for left, right in angles:
+            self.analyze_form(None, self.current_ex, angles={'left': left, 'right': right})
+        return self.exercises[self.current_ex]["repcount"]
+
+
+def threshold_names():
+    """Attribute names set by _init_thresholds, i.e. what a sweep may vary."""
+    probe = object.__new__(ReplayAssistant)
+    SmartPhysioDemoAssistant._init_thresholds(probe)
+    return sorted(vars(probe))
+
+
+def load_recording(paths, exercise=None):
+    """Reads SessionRecorder sidecars into first-person landmarks and an estimated FPS.
+
+    Only frames with a new pose while the session was active (and, with
+    `exercise`, while that exercise was selected) are kept, as those are
+    the frames run() passes to analyze_form. A pose repeated by an
+    asynchronous backend is kept once; sidecars without pose_frame_id
+    keep every row.
+    Returns ((N, 33, 4) float32 array, fps).
+    """
+    points, stamps = [], []
+    last_pose_id = None
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                data = row.get("data", {})
+                if not row.get("poses") or not data.get("session_active", True):
+                    continue
+                if exercise and data.get("exercise", exercise) != exercise:
+                    continue
+                pose_id = row.get("pose_frame_id")
+                if pose_id is not None and pose_id == last_pose_id:
+                    continue
+                last_pose_id = pose_id
+                points.append(row["poses"][0][:NUM_POSE_LANDMARKS])
+                stamps.append(row["capture_ts"])
+    if not points:
+        return np.zeros((0, NUM_POSE_LANDMARKS, 4), dtype=np.float32), 30
+    steps = np.diff(stamps)
+    fps = int(round(1.0 / np.median(steps))) if len(steps) and np.median(steps) > 0 else 30
+    return np.asarray(points, dtype=np.float32), fps
+
+
+def cached_angle_series(paths, exercise, cache_dir):
+    """Angle series for a recording, cached on disk so replays never touch landmarks twice."""
+    key = hashlib.sha1(f"v2|{exercise}".encode('utf-8'))
+    for path in paths:
+        st = os.stat(path)
+        key.update(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode('utf-8'))
+    cache_file = os.path.join(cache_dir, f"angles_{key.hexdigest()[:16]}.npz")
+    if os.path.exists(cache_file):
+        cached = np.load(cache_file)
+        return cached["angles"], int(cached["fps"])
+
+    points, fps = load_recording(paths, exercise)
+    angles = batch_bilateral_angles(points, exercise) if len(points) else np.zeros((0, 2))
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    np.savez(cache_file, angles=angles, fps=fps)
+    return angles, fps
+
+
+def parse_grid(specs):
+    """['down_knee_angle=100:120:5', 'abd_up_angle=80,90'] -> {name: [values]}."""
+    valid = set(threshold_names())
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip()
+        if name not in valid:
+            raise ValueError(f"Unknown threshold '{name}' (choose from {', '.join(sorted(valid))})")
+        if ':' in values:
+            start, stop, step = (float(v) for v in values.split(':'))
+            grid[name] = [float(v) for v in np.arange(start, stop + step / 2, step)]
+        else:
+            grid[name] = [float(v) for v in values.split(',') if v.strip()]
+    return grid
+
+
+_SWEEP_SERIES = None
+
+
+def _sweep_init(series):
+    global _SWEEP_SERIES
+    _SWEEP_SERIES = series
+
+
+def _sweep_eval(config):
+    """Worker task: rep counts of every labelled recording under one threshold config."""
+    return config, [ReplayAssistant(item["exercise"], config, fps=item["fps"]).count_reps(item["angles"])
+                    for item in _SWEEP_SERIES]
+
+
+def run_threshold_sweep(labels_file, grid_specs, workers=None, top=10,
+                        out_file=os.path.join("session_metrics", "threshold_sweep.csv"),
+                        cache_dir=os.path.join("session_metrics", "angle_cache")):
+    """Scores threshold configurations against therapist-labelled rep counts.
+
+    labels_file is a JSON list such as
+      [{"recording": "session_recordings/session_X_seg*.jsonl", "exercise": "squat", "reps": 10}]
+    where "recording" is a sidecar path or glob (segments are read in order).
+    Every combination in the grid is replayed in a process pool; angle
+    series are computed once per recording and cached.
+    """
+    with open(labels_file, encoding='utf-8') as f:
+        labels = json.load(f)
+
+    series = []
+    for entry in labels:
+        paths = sorted(glob.glob(entry["recording"]))
+        if not paths:
+            print(f"Skipping {entry['recording']}: no sidecar files found")
+            continue
+        angles, fps = cached_angle_series(paths, entry["exercise"], cache_dir)
+        series.append({"name": os.path.basename(paths[0]), "exercise": entry["exercise"],
+                       "reps": int(entry["reps"]), "angles": angles, "fps": fps})
+    if not series:
+        print("No labelled recordings to sweep.")
+        return []
+
+    grid = parse_grid(grid_specs)
+    names = list(grid)
+    configs = [{}] + [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+    print(f"Sweeping {len(configs) - 1} configurations over {len(series)} recordings...")
+
+    truth = np.array([item["reps"] for item in series])
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_sweep_init, initargs=(series,)) as pool:
+        for config, counts in pool.map(_sweep_eval, configs, chunksize=max(1, len(configs) // 64)):
+            errors = np.abs(np.array(counts) - truth)
+            row = {"config": "baseline" if not config else
+                   " ".join(f"{k}={v:g}" for k, v in config.items()),
+                   "mean_abs_error": float(np.mean(errors)),
+                   "exact_match_percent": float(np.mean(errors == 0) * 100)}
+            row.update({f"{k}": v for k, v in config.items()})
+            row.update({f"reps[{item['name']}]": c for item, c in zip(series, counts)})
+            rows.append(row)
+
+    baseline = rows[0]
+    rows = sorted(rows[1:], key=lambda r: (r["mean_abs_error"], -r["exact_match_percent"]))
+    print(f"\nBaseline: MAE {baseline['mean_abs_error']:.2f} reps, "
+          f"{baseline['exact_match_percent']:.0f}% exact")
+    for row in rows[:top]:
+        print(f"MAE {row['mean_abs_error']:5.2f}  exact {row['exact_match_percent']:5.1f}%  {row['config']}")
+
+    folder = os.path.dirname(out_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    fieldnames = ["config", "mean_abs_error", "exact_match_percent"] + names + \
+                 [f"reps[{item['name']}]" for item in series]
+    with open(out_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerow({"config": "ground truth", **{f"reps[{item['name']}]": item["reps"] for item in series}})
+        writer.writerows([baseline] + rows)
+    print(f"\nSweep results written to {out_file}")
+    return rows
+
+
+def bench_wrist_refinement(clips, reference=None,
+                           out_file=os.path.join("session_metrics", "wrist_refinement_benchmark.csv")):
+    """Compares hand-crop refinement of the wristext angle with a heavier body model.
+
+    Each clip is run with body model complexity 1, complexity 1 plus
+    WristRefiner, and complexity 2. Cost is pose + refinement time per
+    frame. Without ground truth, steadiness is the accuracy proxy: noise
+    is estimated from second differences of the tracked angle (for white
+    noise, std(diff2) = sqrt(6) * sigma). With a reference CSV of
+    frame_id,angle (e.g. goniometer or hand-annotated), the mean absolute
+    error against it is reported as well.
+    """
+    ref = {}
+    if reference:
+        with open(reference, newline='', encoding='utf-8') as f:
+            ref = {int(r["frame_id"]): float(r["angle"]) for r in csv.DictReader(f)}
+
+    configs = [("complexity1", 1, False), ("complexity1+hand", 1, True), ("complexity2", 2, False)]
+    rows = []
+    for clip in clips:
+        for name, complexity, refine in configs:
+            source = CaptureSource(clip, latest_only=False)
+            if not source.is_opened():
+                print(f"Could not open {clip}")
+                break
+            backend = SolutionsPoseBackend(model_complexity=complexity)
+            preprocessor = FramePreprocessor()
+            assistant = ReplayAssistant("wristext")
+            assistant.wrist_refiner = WristRefiner() if refine else None
+            if refine:
+                assistant.wrist_refiner.load()
+            series, costs = {}, []
+            while True:
+                ret, frame, capture_ts, frame_id = source.read()
+                if not ret:
+                    break
+                _, rgb_frame = preprocessor.process(frame)
+                t0 = time.perf_counter()
+                landmarks = backend.process(rgb_frame, frame_id, capture_ts).landmarks
+                if landmarks:
+                    angles = assistant.get_bilateral_angles(landmarks, "wristext")
+                    if refine:
+                        angles = assistant.refine_wrist_angles(rgb_frame, landmarks, angles)
+                    series[frame_id] = min(angles['left'], angles['right'])
+                costs.append(time.perf_counter() - t0)
+            source.release()
+            backend.close()
+            if assistant.wrist_refiner:
+                assistant.wrist_refiner.close()
+
+            values = np.array(list(series.values()))
+            noise = float(np.std(np.diff(values, n=2)) / math.sqrt(6)) if len(values) > 2 else 0.0
+            common = [fid for fid in series if fid in ref]
+            row = {"clip": os.path.basename(str(clip)), "config": name, "frames": len(costs),
+                   "frames_with_pose": len(series),
+                   "cost_ms_per_frame": float(np.mean(costs) * 1000) if costs else 0.0,
+                   "angle_noise_deg": noise,
+                   "refined_frames": assistant.wrist_refiner.refined if refine else 0,
+                   "mae_vs_reference_deg": float(np.mean([abs(series[fid] - ref[fid]) for fid in common]))
+                   if common else ""}
+            rows.append(row)
+            mae = f" MAE {row['mae_vs_reference_deg']:.1f} deg" if common else ""
+            print(f"{row['clip']:<24} {name:<17} cost={row['cost_ms_per_frame']:6.1f} ms/frame "
+                  f"noise={noise:5.2f} deg{mae}")
+
+    if out_file and rows:
+        folder = os.path.dirname(out_file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(out_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nBenchmark written to {out_file}")
+    return rows
+
+
+def bench_group(clips, people=(1, 2, 4), exercise="squat", separate_backend="tasks", synthetic_frames=2000,
+                out_file=os.path.join("session_metrics", "group_benchmark.csv")):
+    """Per-frame cost of a group session against N separate single-person instances.
+
+    For each person count N:
+      group     one tasks PoseLandmarker with num_poses=N, PersonTracker and
+                the vectorised batch_bilateral_angles, as run() does with
+                PHYSIO_MAX_PEOPLE=N
+      separate  N single-person `separate_backend` instances run on every
+                frame, each with its own per-person angle pass
+    Both feed N exercise state machines. Cost is CPU time per frame (this
+    process, MediaPipe's threads and any worker process), which stays fair
+    for asynchronous backends. The clips should show at least max(people)
+    people. The analysis stage (angles + state machines) is also timed on
+    its own with synthetic poses, which needs no model file.
+    scale_vs_1 is cost relative to the same mode with one person;
+    group_vs_separate is group cost over separate cost for the same N.
+    """
+    rows = []
+    rng = np.random.default_rng(0)
+    for n in people:
+        poses = [[Landmark(*(float(v) for v in rng.random(3)), 1.0) for _ in range(NUM_POSE_LANDMARKS)]
+                 for _ in range(n)]
+        points = np.zeros((n, NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+        for mode in ("group", "separate"):
+            assistants = [ReplayAssistant(exercise) for _ in range(n)]
+            cpu_start = time.process_time()
+            for _ in range(synthetic_frames):
+                if mode == "group":
+                    for i in range(n):
+                        landmarks_to_array(poses[i], out=points[i])
+                    angles = batch_bilateral_angles(points, exercise)
+                    for i in range(n):
+                        assistants[i].analyze_form(poses[i], exercise,
+                                                   angles={'left': angles[i, 0], 'right': angles[i, 1]})
+                else:
+                    for i in range(n):
+                        assistants[i].analyze_form(poses[i], exercise)
+            cpu = time.process_time() - cpu_start
+            rows.append({"clip": "(synthetic)", "stage": "analysis", "mode": mode, "people": n,
+                         "frames": synthetic_frames, "results": synthetic_frames * n,
+                         "cost_ms_per_frame": cpu / synthetic_frames * 1000})
+
+    for clip in clips:
+        for n in people:
+            points = np.zeros((n, NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+            for mode in ("group", "separate"):
+                backends = []
+                try:
+                    for _ in range(1 if mode == "group" else n):
+                        backends.append(make_pose_backend("tasks", num_poses=n) if mode == "group"
+                                        else make_pose_backend(separate_backend))
+                except Exception as e:
+                    for backend in backends:
+                        backend.close()
+                    print(f"Skipping {mode} x{n} on {clip}: {e}")
+                    continue
+                source = CaptureSource(clip, latest_only=False)
+                if not source.is_opened():
+                    print(f"Could not open {clip}")
+                    for backend in backends:
+                        backend.close()
+                    break
+                preprocessor = FramePreprocessor(flip=False)
+                tracker = PersonTracker()
+                assistants = collections.defaultdict(lambda: ReplayAssistant(exercise))
+                last_ids = [0] * len(backends)
+                frames = 0
+                cpu_start = time.process_time() + sum(b.worker_cpu for b in backends)
+                while True:
+                    ret, frame, capture_ts, frame_id = source.read()
+                    if not ret:
+                        break
+                    _, rgb_frame = preprocessor.process(frame)
+                    frames += 1
+                    for b, backend in enumerate(backends):
+                        result = backend.process(rgb_frame, frame_id, capture_ts)
+                        if result is None or result.frame_id == last_ids[b]:
+                            continue
+                        last_ids[b] = result.frame_id
+                        if mode == "group":
+                            found = result.poses[:n]
+                            for i, landmarks in enumerate(found):
+                                landmarks_to_array(landmarks, out=points[i])
+                            angles = batch_bilateral_angles(points[:len(found)], exercise)
+                            for i, pid in enumerate(tracker.update(points[:len(found)])):
+                                assistants[pid].analyze_form(found[i], exercise,
+                                                             angles={'left': angles[i, 0], 'right': angles[i, 1]})
+                        elif result.landmarks:
+                            assistants[b].analyze_form(result.landmarks, exercise)
+                for backend in backends:
+                    backend.drain()
+                cpu = time.process_time() + sum(b.worker_cpu for b in backends) - cpu_start
+                source.release()
+                for backend in backends:
+                    backend.close()
+                rows.append({"clip": os.path.basename(str(clip)), "stage": "pipeline", "mode": mode,
+                             "people": n, "frames": frames, "results": sum(b.results for b in backends),
+                             "cost_ms_per_frame": cpu / frames * 1000 if frames else 0.0})
+
+    for row in rows:
+        same = [r for r in rows if r["clip"] == row["clip"] and r["stage"] == row["stage"]]
+        single = next((r for r in same if r["mode"] == row["mode"] and r["people"] == min(people)), None)
+        separate = next((r for r in same if r["mode"] == "separate" and r["people"] == row["people"]), None)
+        row["scale_vs_1"] = row["cost_ms_per_frame"] / single["cost_ms_per_frame"] \
+            if single and single["cost_ms_per_frame"] else ""
+        row["group_vs_separate"] = row["cost_ms_per_frame"] / separate["cost_ms_per_frame"] \
+            if row["mode"] == "group" and separate and separate["cost_ms_per_frame"] else ""
+        ratio = f" ({row['group_vs_separate']:.2f}x separate)" if row["group_vs_separate"] != "" else ""
+        print(f"{row['clip']:<24} {row['stage']:<9} {row['mode']:<9} people={row['people']} "
+              f"cost={row['cost_ms_per_frame']:7.3f} ms/frame{ratio}")
+
+    if out_file and rows:
+        folder = os.path.dirname(out_file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(out_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nBenchmark written to {out_file}")
+    return rows
+
+
+def run_tool(argv):
+    """Offline tools: `python 5PhysioAudio.py <tool> ...` (no camera session)."""
+    parser = argparse.ArgumentParser(prog="5PhysioAudio.py")
+    tools = parser.add_subparsers(dest="tool", required=True)
+
+    bench = tools.add_parser("bench-backends", help="compare pose backends on recorded clips")
+    bench.add_argument("clips", nargs="+", help="video files or image sequences")
+    bench.add_argument("--backends", default=",".join(POSE_BACKENDS),
+                       help="comma-separated backend names (default: all)")
+    bench.add_argument("--out", default=os.path.join("session_metrics", "backend_benchmark.csv"))
+
+    sweep = tools.add_parser("sweep", help="tune thresholds against labelled recordings")
+    sweep.add_argument("labels", help="JSON list of {recording, exercise, reps}")
+    sweep.add_argument("--grid", nargs="+", required=True, metavar="NAME=VALUES",
+                       help="e.g. down_knee_angle=100:120:5 abd_up_angle=80,90,100")
+    sweep.add_argument("--workers", type=int, default=None)
+    sweep.add_argument("--top", type=int, default=10)
+    sweep.add_argument("--out", default=os.path.join("session_metrics", "threshold_sweep.csv"))
+
+    wrist = tools.add_parser("bench-wrist", help="compare hand-crop wrist refinement with model_complexity=2")
+    wrist.add_argument("clips", nargs="+", help="wrist-extension video files or image sequences")
+    wrist.add_argument("--reference", help="CSV of frame_id,angle to measure accuracy against")
+    wrist.add_argument("--out", default=os.path.join("session_metrics", "wrist_refinement_benchmark.csv"))
+
+    prep = tools.add_parser("bench-preprocess", help="measure frame preprocessing allocations with tracemalloc")
+    prep.add_argument("clips", nargs="+", help="video files or image sequences")
+    prep.add_argument("--frames", type=int, default=300, help="frames per clip (default 300)")
+    prep.add_argument("--out", default=os.path.join("session_metrics", "preprocess_benchmark.csv"))
+
+    group = tools.add_parser("bench-group", help="cost of a group session vs separate single-person instances")
+    group.add_argument("clips", nargs="*", help="videos with several people (omit for the analysis stage only)")
+    group.add_argument("--people", default="1,2,4", help="comma-separated person counts (default 1,2,4)")
+    group.add_argument("--exercise", default="squat", choices=list(ANGLE_TRIPLETS))
+    group.add_argument("--separate-backend", default="tasks", choices=list(POSE_BACKENDS),
+                       help="backend of each single-person instance (default tasks)")
+    group.add_argument("--out", default=os.path.join("session_metrics", "group_benchmark.csv"))
+
+    args = parser.parse_args(argv)
+    if args.tool == "bench-backends":
+        bench_pose_backends(args.clips, [b.strip() for b in args.backends.split(",") if b.strip()],
+                            out_file=args.out)
+    elif args.tool == "sweep":
+        run_threshold_sweep(args.labels, args.grid, workers=args.workers, top=args.top, out_file=args.out)
+    elif args.tool == "bench-wrist":
+        bench_wrist_refinement(args.clips, reference=args.reference, out_file=args.out)
+    elif args.tool == "bench-group":
+        bench_group(args.clips, people=[int(n) for n in args.people.split(",") if n.strip()],
+                    exercise=args.exercise, separate_backend=args.separate_backend, out_file=args.out)
+    elif args.tool == "bench-preprocess":
+        bench_preprocessing(args.clips, max_frames=args.frames, out_file=args.out)
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_tool(sys.argv[1:])
+        sys.exit(0)
+
     mode = ""
     while mode not in ["solo", "assisted"]:
         mode = input("Enter session mode ('solo' or 'assisted'): ").strip().lower()